@@ -1,7 +1,30 @@
 import streamlit as st
+import os
 import time
 import pandas as pd
-from core import scraping, nlp, fake_review, pricing, vision, scoring, dashboard, utils
+from core import scraping, scoring, dashboard, utils, pipeline
+from core.index import ProductIndex
+from core.reviews import ReviewBatch
+from core.history import HistoryStore
+
+INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "product_index")
+STAGE_CACHE_MB = int(os.environ.get("TRUTHLENS_CACHE_MB", "256"))
+# Stored analyses newer than this are reused without re-scraping
+FRESH_SECONDS = float(os.environ.get("TRUTHLENS_FRESH_HOURS", "24")) * 3600
+
+@st.cache_resource
+def get_product_index():
+    # Shared across sessions so every analysis grows the same index
+    return ProductIndex(INDEX_PATH)
+
+@st.cache_resource
+def get_stage_cache():
+    # Shared across sessions; stage results are keyed by input content hashes
+    return pipeline.StageCache(max_bytes=STAGE_CACHE_MB * 1024 * 1024)
+
+@st.cache_resource
+def get_history_store():
+    return HistoryStore()
 
 # Page Config
 st.set_page_config(
@@ -128,13 +151,20 @@ if input_method == "Product Link":
     with col1:
         if st.button("Fetch Details", use_container_width=True):
             if product_url:
-                with st.spinner("Scraping..."):
-                    data = scraping.scrape_product(product_url)
-                    if data and "error" not in data:
-                        st.session_state['scraped_data'] = data
-                        st.rerun()
-                    else:
-                        st.error("Failed to scrape.")
+                history_store = get_history_store()
+                product_id = history_store.resolve_product_id(product_url)
+                data = None
+                if product_id and history_store.latest_snapshot(product_id, max_age=FRESH_SECONDS):
+                    # Analyzed recently (possibly via a differently formatted URL)
+                    data = history_store.load_product(product_id)
+                if not data:
+                    with st.spinner("Scraping..."):
+                        data = scraping.scrape_product(product_url, store=history_store)
+                if data and "error" not in data:
+                    st.session_state['scraped_data'] = data
+                    st.rerun()
+                else:
+                    st.error("Failed to scrape.")
             else:
                 st.sidebar.warning("Enter URL.")
     
@@ -166,30 +196,66 @@ if st.button("🚀 ANALYZE PRODUCT"):
         st.markdown("---")
         
         # 1. Run Analysis
-        reviews_list = [r.strip() for r in reviews_text.split('\n') if r.strip()]
-        
-        with st.spinner("Analyzing Sentiment (NLP)..."):
-            sentiment_res = nlp.analyze_sentiment(reviews_list)
-        
-        with st.spinner("Detecting Fake Reviews..."):
-            fake_res = fake_review.detect_fake_reviews(reviews_list)
-            
-        with st.spinner("Analyzing Pricing..."):
-             # Default category if not selected
-            cat = "Electronics" if input_method == "Product Link" else category
-            price_res = pricing.price_fairness(product_price, cat, specs_text)
-            
-        with st.spinner("Analyzing Visuals..."):
-            img_bytes = image_file.read() if image_file else None
-            vision_res = vision.analyze_image(img_bytes)
-
-        # Calculate Overall Score
-        overall_score = scoring.calculate_overall_score(
-            sentiment_res['overall_score'],
-            fake_res['fake_score'],
-            price_res['label'],
-            vision_res.get('quality_score', 0)
-        )
+        # Shared by every stage so reviews are split/normalized only once
+        review_batch = ReviewBatch.from_text(reviews_text)
+        # Stages whose inputs are unchanged since a previous run are served from cache
+        stage_cache = get_stage_cache()
+        history_store = get_history_store()
+        product_id = history_store.resolve_product_id(product_url) if input_method == "Product Link" else None
+        # Default category if not selected
+        cat = "Electronics" if input_method == "Product Link" else category
+        # getvalue() is safe to call on every rerun, unlike read()
+        img_bytes = image_file.getvalue() if image_file else None
+
+        input_hash = pipeline.analysis_input_hash(review_batch, product_price, cat, specs_text, img_bytes)
+        stored = history_store.latest_snapshot(product_id, max_age=FRESH_SECONDS) if product_id else None
+
+        if stored and stored["input_hash"] == input_hash:
+            # Same inputs as a recent analysis: reuse it as-is
+            sentiment_res = dict(stored["sentiment"], cached=True)
+            fake_res = stored["fake"]
+            price_res = stored["price"]
+            vision_res = stored["vision"]
+            overall_score = stored["overall_score"]
+            st.caption(f"Loaded stored analysis from {time.strftime('%Y-%m-%d %H:%M', time.localtime(stored['created_at']))}.")
+        else:
+            if product_id:
+                with st.spinner("Analyzing New Reviews (NLP + Fake Detection)..."):
+                    sentiment_res, fake_res, new_reviews = pipeline.incremental_review_stages(
+                        review_batch, history_store, product_id, stage_cache
+                    )
+                st.caption(f"Analyzed {new_reviews} new of {len(review_batch)} reviews.")
+            else:
+                with st.spinner("Analyzing Sentiment (NLP)..."):
+                    sentiment_res = pipeline.sentiment_stage(review_batch, stage_cache)
+                
+                with st.spinner("Detecting Fake Reviews..."):
+                    fake_res = pipeline.fake_review_stage(review_batch, stage_cache)
+                
+            with st.spinner("Analyzing Pricing..."):
+                price_res = pipeline.pricing_stage(product_price, cat, specs_text, stage_cache)
+                
+            with st.spinner("Analyzing Visuals..."):
+                vision_res = pipeline.vision_stage(img_bytes, stage_cache)
+
+            # Calculate Overall Score
+            overall_score = scoring.calculate_overall_score(
+                sentiment_res['overall_score'],
+                fake_res['fake_score'],
+                price_res['label'],
+                vision_res.get('quality_score', 0)
+            )
+
+            if product_id:
+                history_store.save_analysis(
+                    product_id,
+                    review_batch,
+                    {"sentiment": sentiment_res, "fake": fake_res, "price": price_res,
+                     "vision": vision_res, "overall_score": overall_score},
+                    cat,
+                    product_price,
+                    input_hash
+                )
 
         # 2. Display Results
         st.title(f"Analysis Result: {product_name}")
@@ -207,25 +273,58 @@ if st.button("🚀 ANALYZE PRODUCT"):
         col6.metric("Image Quality", f"{vision_res.get('quality_score', 0)}/10")
         col7.metric("Sustainability Score", "7/10") # Placeholder
 
+        # Score history for this product (from stored snapshots)
+        if product_id:
+            trend = history_store.product_trend(product_id)
+            if len(trend) > 1:
+                st.markdown("### 📈 Score History")
+                df_trend = pd.DataFrame(trend)
+                df_trend.index = pd.to_datetime(df_trend.pop("created_at"), unit="s")
+                st.line_chart(df_trend[["overall_score", "sentiment_score"]])
+
         # 3. AMD Performance Section
         st.markdown("### ⚡ AMD Hardware Optimization")
         perf_col1, perf_col2 = st.columns(2)
         with perf_col1:
             st.info(f"Inference Device: **{sentiment_res['device']}**")
         with perf_col2:
-            st.success(f"Inference Time: **{round(sentiment_res['inference_time'], 4)} seconds**")
+            if sentiment_res.get("cached"):
+                # Nothing was inferred on this run, so there is no time to report
+                st.success("Inference Time: **cached** (reused an earlier result)")
+            else:
+                st.success(f"Inference Time: **{round(sentiment_res['inference_time'], 4)} seconds**")
         
         if sentiment_res['device'] == 'GPU':
              st.caption("🚀 ROCm Acceleration Active! Performance boosted.")
 
         # 4. Visual Dashboard
-        dashboard.generate_dashboard(reviews_list, sentiment_res, fake_res['fake_score'])
+        dashboard.generate_dashboard(review_batch, sentiment_res, fake_res['fake_score'], stage_cache)
 
         # 5. Comparison / Alternatives
         st.markdown("---")
         st.subheader("💡 Suggested Alternatives")
         st.write("Based on your analysis, here are similar products with better scores:")
-        st.info("• Placeholder Alternative A (Score: 9.2)\n• Placeholder Alternative B (Score: 8.8)")
+
+        product_index = get_product_index()
+        # Look within a +/-30% price band of the current product
+        price_band = (product_price * 0.7, product_price * 1.3) if product_price > 0 else None
+        alternatives = product_index.query(
+            product_name,
+            specs_text,
+            k=3,
+            min_score=overall_score,
+            price_range=price_band
+        )
+        if alternatives:
+            st.info("\n".join(
+                f"• {alt['title']} (Score: {alt['score']}, Price: {alt['price']:.2f})" for alt in alternatives
+            ))
+        else:
+            st.info("No better-scoring similar products analyzed yet. Alternatives appear as more products are analyzed.")
+
+        if product_name:
+            product_index.add(product_name, cat, product_price, overall_score, specs_text)
+            product_index.save()
 
 # Footer
 st.markdown("---")
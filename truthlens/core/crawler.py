@@ -0,0 +1,423 @@
+import os
+import json
+import time
+import heapq
+import base64
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urljoin, urlparse
+from bs4 import BeautifulSoup
+import numpy as np
+import requests
+from .http_replay import fetch, save_recording
+from .history import canonical_product_id
+from .scraping import get_headers, scrape_product
+
+STATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "crawl_state.json")
+
+# Listing pages are expanded before products so the frontier fills quickly
+LISTING, PRODUCT = 0, 1
+
+# Listing responses worth retrying later (rate limits, overload, gateway errors)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class RetryableFetchError(RuntimeError):
+    pass
+
+class BloomFilter:
+    """
+    Fixed-size URL-seen filter. False positives (skipping an unseen URL)
+    happen at roughly `error_rate`; false negatives never do.
+    """
+
+    def __init__(self, capacity=1_000_000, error_rate=0.001, bits=None):
+        self.size = int(-capacity * np.log(error_rate) / (np.log(2) ** 2))
+        self.hash_count = max(1, int(round(self.size / capacity * np.log(2))))
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.bits = bits if bits is not None else bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hash_count)]
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+    def to_state(self):
+        return {
+            "capacity": self.capacity,
+            "error_rate": self.error_rate,
+            "bits": base64.b64encode(bytes(self.bits)).decode("ascii")
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        return cls(state["capacity"], state["error_rate"], bytearray(base64.b64decode(state["bits"])))
+
+
+def extract_links(html, base_url):
+    """
+    Returns (product_urls, listing_urls) found on a category/search page.
+    Product links are recognised by having a canonical product ID; listing
+    links are pagination ("next") links.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    products, listings = [], []
+    for a in soup.find_all("a", href=True):
+        url = urljoin(base_url, a["href"])
+        if canonical_product_id(url):
+            products.append(url)
+            continue
+        classes = " ".join(a.get("class", []))
+        text = a.get_text(strip=True).lower()
+        if "next" in (a.get("rel") or []) or "s-pagination-next" in classes or text in ("next", "next page"):
+            listings.append(url)
+    return products, listings
+
+
+class Crawler:
+    """
+    Crawls category/search pages into a deduplicated priority frontier and
+    pipes discovered products through scraping and analysis.
+
+    Products never analyzed come first, then the stalest ones. Fetches run
+    with bounded concurrency and a per-host politeness delay. Rate-limited
+    listings and blocked product pages go back on the frontier behind
+    untried URLs, up to `max_retries` times, and their host backs off.
+    The frontier and the Bloom filter of URLs seen in the current crawl are
+    saved to `state_path` so crawls can resume.
+    """
+
+    def __init__(self, state_path=STATE_PATH, store=None, cache=None, index=None, category="Electronics",
+                 max_workers=4, delay=1.0, max_age=7 * 24 * 3600, bloom_capacity=1_000_000,
+                 max_retries=3, retry_backoff=5.0):
+        self.state_path = state_path
+        self.store = store
+        self.cache = cache
+        self.index = index
+        self.category = category
+        self.max_workers = max_workers
+        self.delay = delay
+        self.max_age = max_age
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.frontier = []
+        self.seq = 0
+        self.seen = BloomFilter(bloom_capacity)
+        self.stats = {"listings": 0, "scraped": 0, "analyzed": 0, "skipped_fresh": 0, "blocked": 0, "errors": 0,
+                      "retried": 0, "gave_up": 0}
+        self._host_next = {}
+        self._host_lock = threading.Lock()
+
+        if state_path and os.path.exists(state_path):
+            self.load_state()
+
+    def _product_id(self, url):
+        # The store maps Flipkart ?pid= URLs to the itm ID once it has seen both
+        return self.store.resolve_product_id(url) if self.store is not None else canonical_product_id(url)
+
+    def _staleness(self, product_id):
+        # Seconds since last analysis; never-analyzed products are infinitely stale
+        if self.store is None:
+            return float("inf")
+        snapshot = self.store.latest_snapshot(product_id)
+        return float("inf") if snapshot is None else time.time() - snapshot["created_at"]
+
+    def add_url(self, url, kind=None):
+        """
+        Adds a URL to the frontier unless it was already seen in this crawl
+        or, for products, was analyzed within max_age. Returns True if added.
+        """
+        product_id = self._product_id(url)
+        if kind is None:
+            kind = PRODUCT if product_id else LISTING
+
+        staleness = 0.0
+        if kind == PRODUCT:
+            # Freshness is checked first: products seen in earlier crawls are
+            # queued again once their last analysis is older than max_age
+            staleness = self._staleness(product_id)
+            if staleness < self.max_age:
+                self.stats["skipped_fresh"] += 1
+                return False
+        key = product_id or url
+        if key in self.seen:
+            return False
+        self.seen.add(key)
+
+        # heapq is a min-heap: most stale first, never-analyzed before all
+        priority = -1e18 if staleness == float("inf") else -staleness
+        self._push(kind, priority, url)
+        return True
+
+    def _push(self, kind, priority, url, retries=0):
+        heapq.heappush(self.frontier, (kind, priority, self.seq, url, retries))
+        self.seq += 1
+
+    def _retry(self, kind, url, retries, reason):
+        """
+        Puts a failed URL back on the frontier behind every untried URL of
+        its kind and delays further requests to its host. Returns False once
+        max_retries is used up.
+        """
+        if retries >= self.max_retries:
+            print(f"Crawler giving up on {url} after {retries} retries: {reason}")
+            self.stats["gave_up"] += 1
+            return False
+        retries += 1
+        host = urlparse(url).netloc
+        with self._host_lock:
+            resume_at = time.monotonic() + self.retry_backoff * 2 ** (retries - 1)
+            self._host_next[host] = max(self._host_next.get(host, 0.0), resume_at)
+        # Untried URLs have priorities <= 0, so retries sort after them
+        self._push(kind, float(retries), url, retries)
+        self.stats["retried"] += 1
+        return True
+
+    def _wait_politely(self, url):
+        host = urlparse(url).netloc
+        with self._host_lock:
+            now = time.monotonic()
+            start = max(now, self._host_next.get(host, now))
+            self._host_next[host] = start + self.delay
+        if start > now:
+            time.sleep(start - now)
+
+    def _fetch_listing(self, url):
+        self._wait_politely(url)
+        try:
+            response = fetch(url, headers=get_headers(), timeout=10)
+        except requests.RequestException as e:
+            raise RetryableFetchError(f"{e} for {url}") from e
+        if response.status_code in RETRY_STATUSES:
+            raise RetryableFetchError(f"HTTP {response.status_code} for {url}")
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code} for {url}")
+        products, listings = extract_links(response.content, url)
+        if not products and not listings:
+            # Bot walls come back as 200 pages without any catalog links
+            raise RetryableFetchError(f"No links on {url} (blocked?)")
+        return products, listings
+
+    def _scrape(self, url):
+        self._wait_politely(url)
+        return scrape_product(url, store=self.store)
+
+    def _analyze(self, url, data):
+        # Imported here so link discovery works without the ML stack loaded
+        from . import pipeline
+        price = float(data.get("price") or 0.0)
+        results = pipeline.run_analysis(
+            data.get("reviews", []),
+            price,
+            self.category,
+            cache=self.cache,
+            store=self.store,
+            product_id=data.get("product_id") or self._product_id(url)
+        )
+        if self.index is not None:
+            self.index.add(data.get("title"), self.category, price, results["overall_score"])
+        return results
+
+    def run(self, seeds=(), max_products=100, on_result=None, checkpoint_every=10):
+        """
+        Crawls until the frontier is empty or max_products were analyzed in
+        this run. on_result(url, data, results) is called for each product.
+        """
+        if not self.frontier:
+            # The previous crawl finished: start a new one with an empty seen
+            # set, so listings are expanded again and stale products re-queued
+            self.seen = BloomFilter(self.seen.capacity, self.seen.error_rate)
+        for url in seeds:
+            self.add_url(url)
+
+        analyzed = 0
+        in_flight = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while (self.frontier or in_flight) and analyzed < max_products:
+                # Keep the pool busy without pulling the whole frontier into memory
+                while self.frontier and len(in_flight) < self.max_workers * 2:
+                    kind, _, _, url, retries = heapq.heappop(self.frontier)
+                    task = self._fetch_listing if kind == LISTING else self._scrape
+                    in_flight[pool.submit(task, url)] = (kind, url, retries)
+
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, url, retries = in_flight.pop(future)
+                    try:
+                        result = future.result()
+                    except RetryableFetchError as e:
+                        self._retry(kind, url, retries, e)
+                        continue
+                    except Exception as e:
+                        print(f"Crawler error on {url}: {e}")
+                        self.stats["errors"] += 1
+                        continue
+
+                    if kind == LISTING:
+                        self.stats["listings"] += 1
+                        products, listings = result
+                        for link in products:
+                            self.add_url(link, PRODUCT)
+                        for link in listings:
+                            self.add_url(link, LISTING)
+                    elif "Fallback" in result.get("source", ""):
+                        # Blocked page: the scraper returned simulated data, don't analyze it
+                        self.stats["blocked"] += 1
+                        self._retry(kind, url, retries, "blocked")
+                    elif "error" in result:
+                        self.stats["errors"] += 1
+                    elif analyzed >= max_products:
+                        # Finished after the limit was hit: analyze it next run
+                        self._push(kind, -1e18, url, retries)
+                    else:
+                        self.stats["scraped"] += 1
+                        # Analysis runs here while the pool keeps scraping
+                        results = self._analyze(url, result)
+                        analyzed += 1
+                        self.stats["analyzed"] += 1
+                        if on_result:
+                            on_result(url, result, results)
+                        if analyzed % checkpoint_every == 0:
+                            self.save_state()
+
+                if analyzed >= max_products:
+                    # Unfinished work goes back to the frontier for the next run
+                    for future, (kind, url, retries) in in_flight.items():
+                        future.cancel()
+                        self._push(kind, -1e18, url, retries)
+                    in_flight = {}
+
+        self.save_state()
+        if self.index is not None:
+            self.index.save()
+            if self.index.partitions_stale():
+                # Rebuilt from the saved rows without holding the index lock
+                self.index.build_partitions()
+                self.index.save()
+        return self.stats
+
+    def save_state(self):
+        if not self.state_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+        state = {
+            "frontier": self.frontier,
+            "seq": self.seq,
+            "seen": self.seen.to_state(),
+            "stats": self.stats
+        }
+        tmp = self.state_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.state_path)
+
+    def load_state(self):
+        with open(self.state_path, encoding="utf-8") as f:
+            state = json.load(f)
+        # Entries saved before retries were tracked have no retry count
+        self.frontier = [tuple(item) if len(item) == 5 else (*item, 0) for item in state["frontier"]]
+        heapq.heapify(self.frontier)
+        self.seq = state["seq"]
+        self.seen = BloomFilter.from_state(state["seen"])
+        self.stats.update(state.get("stats", {}))
+
+
+def build_stand_in_site(recordings_dir, n_products=50, per_page=10, base_url="https://www.amazon.in"):
+    """
+    Writes a synthetic Amazon-like catalog (paginated search pages and
+    product pages) as recordings for the replay server. Returns the URL of
+    the first search page to use as a crawl seed.
+    """
+    pages = (n_products + per_page - 1) // per_page
+    for page in range(pages):
+        links = []
+        for i in range(page * per_page, min(n_products, (page + 1) * per_page)):
+            asin = f"B0TEST{i:04d}"
+            links.append(f'<a href="/Test-Product-{i}/dp/{asin}/ref=sr_1_{i}">Test Product {i}</a>')
+            product_html = f"""<html><body>
+                <span id="productTitle">Test Product {i}</span>
+                <span class="a-price-whole">{100 + i * 10}</span>
+                <span class="a-icon-alt">{3 + i % 3}.0 out of 5 stars</span>
+                <div data-hook="review"><span data-hook="review-body">Works well, good value for money.</span></div>
+                <div data-hook="review"><span data-hook="review-body">Stopped working after {i % 7 + 1} weeks.</span></div>
+            </body></html>"""
+            save_recording(f"{base_url}/Test-Product-{i}/dp/{asin}/ref=sr_1_{i}", 200, product_html.encode("utf-8"),
+                           recordings_dir=recordings_dir)
+        if page + 1 < pages:
+            links.append(f'<a class="s-pagination-next" href="/s?k=test&page={page + 2}">Next</a>')
+        save_recording(f"{base_url}/s?k=test&page={page + 1}", 200,
+                       f"<html><body>{''.join(links)}</body></html>".encode("utf-8"), recordings_dir=recordings_dir)
+    return f"{base_url}/s?k=test&page=1"
+
+
+if __name__ == "__main__":
+    # Usage (from the truthlens directory):
+    #   python -m core.crawler "https://www.amazon.in/s?k=laptop" --max-products 50
+    #   python -m core.crawler --stand-in 100 --max-products 100 --delay 0
+    parser = argparse.ArgumentParser(description="Crawl category/search pages and analyze discovered products.")
+    parser.add_argument("seeds", nargs="*", help="Category or search result URLs")
+    parser.add_argument("--state", default=STATE_PATH)
+    parser.add_argument("--category", default="Electronics")
+    parser.add_argument("--max-products", type=int, default=100)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--delay", type=float, default=1.0, help="Seconds between requests to the same host")
+    parser.add_argument("--max-age-hours", type=float, default=24 * 7, help="Re-analyze products older than this")
+    parser.add_argument("--max-retries", type=int, default=3,
+                        help="Retries for rate-limited listings and blocked product pages")
+    parser.add_argument("--stand-in", type=int, default=0, metavar="N",
+                        help="Crawl a local stand-in site with N synthetic products")
+    args = parser.parse_args()
+
+    from . import http_replay
+    from .history import HistoryStore
+    from .index import ProductIndex
+    from .pipeline import StageCache
+
+    server = None
+    seeds = list(args.seeds)
+    if args.stand_in:
+        import tempfile
+        recordings = tempfile.mkdtemp(prefix="truthlens_site_")
+        seeds.append(build_stand_in_site(recordings, args.stand_in))
+        server = http_replay.ReplayServer(port=0, recordings_dir=recordings).start()
+        http_replay.set_mode("replay", recordings_dir=recordings, replay_url=server.url)
+
+    state_path = args.state
+    history_path = None
+    if args.stand_in:
+        # Keep test crawls out of the real history, index and frontier
+        state_path = os.path.join(recordings, "crawl_state.json")
+        history_path = os.path.join(recordings, "history.sqlite")
+    data_dir = os.path.dirname(os.path.abspath(state_path))
+    # Same index directory as the app: saves take a file lock and merge with
+    # rows the app wrote, and the app reloads the index when it changes
+    crawler = Crawler(
+        state_path=state_path,
+        store=HistoryStore(history_path) if history_path else HistoryStore(),
+        cache=StageCache(),
+        index=ProductIndex(os.path.join(data_dir, "product_index")),
+        category=args.category,
+        max_workers=args.workers,
+        delay=args.delay,
+        max_age=args.max_age_hours * 3600,
+        max_retries=args.max_retries
+    )
+    stats = crawler.run(
+        seeds,
+        max_products=args.max_products,
+        on_result=lambda url, data, results: print(f"{results['overall_score']}/10  {data.get('title')}")
+    )
+    print(f"Crawl finished: {stats}, {len(crawler.frontier)} URLs left in frontier")
+    if server:
+        server.stop()
@@ -2,11 +2,14 @@ import plotly.express as px
 from wordcloud import WordCloud
 import pandas as pd
 import streamlit as st
+from .reviews import ReviewBatch
 
-def generate_dashboard(reviews, sentiment_data, fake_score):
+def generate_dashboard(reviews, sentiment_data, fake_score, cache=None):
     """
     Generates and displays the Review Analytics Dashboard in Streamlit interactively.
+    If a StageCache is given, the word cloud image is reused across reruns.
     """
+    reviews = ReviewBatch.coerce(reviews)
     if not reviews:
         st.warning("No reviews available for analysis.")
         return
@@ -36,7 +39,7 @@ def generate_dashboard(reviews, sentiment_data, fake_score):
     # 2. Review Length Distribution
     with col2:
         st.subheader("Review Length Distribution")
-        review_lens = [len(r.split()) for r in reviews]
+        review_lens = reviews.word_counts
         df_lens = pd.DataFrame({'Word Count': review_lens})
         
         fig2 = px.histogram(
@@ -51,12 +54,18 @@ def generate_dashboard(reviews, sentiment_data, fake_score):
 
     # 3. Word Cloud
     st.subheader("☁️ Word Cloud (Common Terms)")
-    text = " ".join(reviews)
-    wordcloud = WordCloud(width=800, height=400, background_color='white').generate(text)
+    def render_wordcloud():
+        text = reviews.joined
+        return WordCloud(width=800, height=400, background_color='white').generate(text).to_array()
+
+    if cache is not None:
+        wordcloud_image = cache.get_or_compute(("wordcloud", reviews.content_hash), render_wordcloud)
+    else:
+        wordcloud_image = render_wordcloud()
     
     # Plotly doesn't natively support word clouds easily without complex scatters.
     # Displaying as a native Streamlit image is the cleanest way.
-    st.image(wordcloud.to_array(), use_container_width=True)
+    st.image(wordcloud_image, use_container_width=True)
 
     # 4. Fake Review Indicators
     st.markdown("---")
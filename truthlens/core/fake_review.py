@@ -1,7 +1,29 @@
 import re
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.linear_model import LogisticRegression
+import os
+import csv
+import json
+import time
+import zlib
+import argparse
+import joblib
+from sklearn.feature_extraction.text import TfidfVectorizer, HashingVectorizer
+from sklearn.linear_model import LogisticRegression, SGDClassifier
 import numpy as np
+from .reviews import ReviewBatch
+
+# Trained model produced by train_streaming(); the dummy model is used if missing or unreadable
+MODEL_PATH = os.environ.get(
+    "TRUTHLENS_FAKE_MODEL",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "models", "fake_review.joblib")
+)
+
+# Stateless features: no vocabulary, so memory stays fixed regardless of corpus size
+HASHING_PARAMS = {
+    "n_features": 2 ** 20,
+    "alternate_sign": False,
+    "stop_words": "english",
+    "norm": "l2"
+}
 
 # Simple training data for demonstration (in a real app, load a pre-trained model)
 # 0 = Real, 1 = Fake
@@ -27,55 +49,251 @@ def train_dummy_model():
     model.fit(X, labels)
     return model, vectorizer
 
-# Initialize model (lazy loading ideally, but simple here)
-model, vectorizer = train_dummy_model()
+def load_model(path=MODEL_PATH):
+    """
+    Loads a model saved by train_streaming(). The hashing vectorizer is
+    rebuilt from its parameters, so no vocabulary is stored or loaded.
+    """
+    artifact = joblib.load(path)
+    return artifact["model"], HashingVectorizer(**artifact["vectorizer_params"])
+
+def _save_model(model, path, metrics=None, progress=None):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = path + ".tmp"
+    artifact = {"model": model, "vectorizer_params": HASHING_PARAMS, "metrics": metrics or []}
+    if progress is not None:
+        # Checkpoints also record where training stopped, for resume
+        artifact["progress"] = progress
+    joblib.dump(artifact, tmp)
+    os.replace(tmp, path)
+
+def _load_checkpoint(path, chunk_size):
+    artifact = joblib.load(path)
+    progress = artifact.get("progress")
+    if progress is None:
+        raise ValueError(f"{path} has no training progress to resume from")
+    if progress["chunk_size"] != chunk_size:
+        raise ValueError(
+            f"Checkpoint was written with chunk size {progress['chunk_size']}, not {chunk_size}"
+        )
+    return artifact["model"], artifact["metrics"], progress
+
+def _parse_label(value):
+    # 0 = Real, 1 = Fake
+    value = str(value).strip().lower()
+    if value in ("1", "fake", "true", "spam"):
+        return 1
+    if value in ("0", "real", "false", "genuine"):
+        return 0
+    return None
+
+def iter_labeled_chunks(path, chunk_size=10000, text_field="text", label_field="label"):
+    """
+    Streams (texts, labels) chunks from a labeled JSONL or CSV file.
+    Rows with a missing text or unknown label are skipped.
+    """
+    texts, labels = [], []
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            rows = csv.DictReader(f)
+        else:
+            rows = (json.loads(line) for line in f if line.strip())
+
+        for row in rows:
+            text = row.get(text_field)
+            label = _parse_label(row.get(label_field))
+            if not text or label is None:
+                continue
+            texts.append(text)
+            labels.append(label)
+            if len(texts) >= chunk_size:
+                yield texts, labels
+                texts, labels = [], []
+    if texts:
+        yield texts, labels
+
+def _is_holdout(text, holdout_pct):
+    # Deterministic split, so the same rows are held out in every epoch
+    return zlib.crc32(text.encode("utf-8")) % 100 < holdout_pct
+
+def evaluate_streaming(model, vectorizer, path, chunk_size=10000, holdout_pct=5, **fields):
+    """
+    Computes accuracy, precision, recall and log loss on the held-out rows.
+    """
+    tp = fp = tn = fn = 0
+    total_loss = 0.0
+    for texts, labels in iter_labeled_chunks(path, chunk_size, **fields):
+        held = [i for i, t in enumerate(texts) if _is_holdout(t, holdout_pct)]
+        if not held:
+            continue
+        y = np.array([labels[i] for i in held])
+        probs = model.predict_proba(vectorizer.transform([texts[i] for i in held]))[:, 1]
+        preds = probs >= 0.5
+        tp += int(np.sum(preds & (y == 1)))
+        fp += int(np.sum(preds & (y == 0)))
+        tn += int(np.sum(~preds & (y == 0)))
+        fn += int(np.sum(~preds & (y == 1)))
+        probs = np.clip(probs, 1e-15, 1 - 1e-15)
+        total_loss -= float(np.sum(y * np.log(probs) + (1 - y) * np.log(1 - probs)))
+
+    n = tp + fp + tn + fn
+    if n == 0:
+        return {"holdout_rows": 0}
+    return {
+        "holdout_rows": n,
+        "accuracy": round((tp + tn) / n, 4),
+        "precision": round(tp / (tp + fp), 4) if tp + fp else 0.0,
+        "recall": round(tp / (tp + fn), 4) if tp + fn else 0.0,
+        "log_loss": round(total_loss / n, 4)
+    }
+
+def train_streaming(path, out_path=MODEL_PATH, epochs=1, chunk_size=10000, holdout_pct=5,
+                    checkpoint_every=50, text_field="text", label_field="label", resume=False):
+    """
+    Trains the fake-review classifier out-of-core on a labeled JSONL/CSV file.
+    Chunks are hashed (no vocabulary) and fed to an online logistic-regression
+    classifier via partial_fit. A checkpoint is written every
+    `checkpoint_every` chunks and held-out metrics are reported per epoch.
+    With resume=True, training continues from the epoch and chunk recorded
+    in an existing checkpoint (same file and chunk size expected).
+    """
+    vectorizer = HashingVectorizer(**HASHING_PARAMS)
+    model = SGDClassifier(loss="log_loss", alpha=1e-6, random_state=0)
+    fields = {"text_field": text_field, "label_field": label_field}
+    metrics = []
+    ckpt_path = out_path + ".ckpt"
+    progress = {"epoch": 1, "chunk": 0, "rows": 0, "chunk_size": chunk_size}
+
+    if resume:
+        if os.path.exists(ckpt_path):
+            model, metrics, progress = _load_checkpoint(ckpt_path, chunk_size)
+            print(f"Resuming at epoch {progress['epoch']}, after chunk {progress['chunk']}")
+        else:
+            print(f"No checkpoint at {ckpt_path}, starting from scratch")
+
+    for epoch in range(progress["epoch"], epochs + 1):
+        start_time = time.time()
+        # Only the resumed epoch starts part-way through the file
+        skip = progress["chunk"] if epoch == progress["epoch"] else 0
+        rows = progress["rows"] if epoch == progress["epoch"] else 0
+        for chunk_no, (texts, labels) in enumerate(iter_labeled_chunks(path, chunk_size, **fields), 1):
+            if chunk_no <= skip:
+                continue
+            train = [i for i, t in enumerate(texts) if not _is_holdout(t, holdout_pct)]
+            if not train:
+                continue
+            X = vectorizer.transform([texts[i] for i in train])
+            model.partial_fit(X, [labels[i] for i in train], classes=[0, 1])
+            rows += len(train)
+            if chunk_no % checkpoint_every == 0:
+                _save_model(model, ckpt_path, metrics,
+                            {"epoch": epoch, "chunk": chunk_no, "rows": rows, "chunk_size": chunk_size})
+                print(f"Epoch {epoch}: checkpoint after {rows} rows")
+
+        if rows == 0:
+            raise ValueError(f"No labeled training rows found in {path}")
+
+        epoch_metrics = evaluate_streaming(model, vectorizer, path, chunk_size, holdout_pct, **fields)
+        epoch_metrics.update({"epoch": epoch, "train_rows": rows, "seconds": round(time.time() - start_time, 2)})
+        metrics.append(epoch_metrics)
+        print(f"Epoch {epoch}: {epoch_metrics}")
+        _save_model(model, ckpt_path, metrics,
+                    {"epoch": epoch + 1, "chunk": 0, "rows": 0, "chunk_size": chunk_size})
+
+    _save_model(model, out_path, metrics)
+    if os.path.exists(ckpt_path):
+        os.remove(ckpt_path)
+    return model, metrics
+
+# Initialize model: trained model if available, otherwise the demo model
+model = None
+if os.path.exists(MODEL_PATH):
+    try:
+        model, vectorizer = load_model(MODEL_PATH)
+    except Exception as e:
+        # Corrupt or incompatible file (e.g. saved by another scikit-learn version)
+        print(f"Fake review model at {MODEL_PATH} failed to load, using demo model: {e}")
+if model is None:
+    model, vectorizer = train_dummy_model()
+
+# Heuristic checks: repetitive patterns or over-enthusiasm
+SUSPICIOUS_RE = re.compile("|".join([
+    r"highly recommend",
+    r"best product ever",
+    r"received for free",
+    r"exchange for a review",
+    r"wow",
+    r"amazing",
+    r"five stars"
+]))
 
 def detect_fake_reviews(reviews):
     """
-    Analyzes reviews for signs of being fake/spam.
+    Analyzes reviews (a list or a ReviewBatch) for signs of being fake/spam.
     Returns a probability score (0-100%) and a list of flagged reviews.
+    Per-review heuristic and model scores are stored on the batch.
     """
-    if not reviews:
+    batch = ReviewBatch.coerce(reviews)
+    if not batch:
         return {"fake_score": 0, "flagged_reviews": []}
 
-    # Heuristic checks
-    suspicious_patterns = [
-        r"highly recommend",
-        r"best product ever",
-        r"received for free",
-        r"exchange for a review",
-        r"wow",
-        r"amazing",
-        r"five stars"
-    ]
-    
-    flagged = []
-    heuristic_count = 0
-    
-    for review in reviews:
-        # Check repetitive patterns or over-enthusiasm
-        if any(re.search(p, review.lower()) for p in suspicious_patterns):
-            heuristic_count += 1
-            flagged.append(review)
-        
-        # Check length (very short reviews can be suspicious)
-        if len(review.split()) < 5:
-            heuristic_count += 0.5 # Weight less
+    # Normalized text is already lowercased
+    flagged = np.array([SUSPICIOUS_RE.search(r) is not None for r in batch.normalized], dtype=bool)
+    heuristic = flagged.astype(np.float32)
+    # Check length (very short reviews can be suspicious)
+    heuristic += np.where(batch.word_counts < 5, 0.5, 0.0).astype(np.float32) # Weight less
 
     # TF-IDF + Model Prediction (Soft voting)
     try:
-        X_test = vectorizer.transform(reviews)
+        X_test = vectorizer.transform(batch.text)
         probs = model.predict_proba(X_test)[:, 1] # Probability of being fake
-        avg_model_prob = np.mean(probs)
     except:
-        avg_model_prob = 0.0
+        probs = np.zeros(len(batch))
+
+    batch.set_scores("fake_flagged", flagged)
+    batch.set_scores("fake_heuristic", heuristic)
+    batch.set_scores("fake_prob", probs.astype(np.float32))
+
+    return summarize_fake_reviews(batch)
+
+def summarize_fake_reviews(batch):
+    """
+    Aggregates the per-review fake-review arrays of a batch into the summary dict.
+    """
+    avg_model_prob = float(np.mean(batch.scores["fake_prob"]))
 
     # Combine scores
-    heuristic_score = (heuristic_count / len(reviews)) * 100
+    heuristic_score = (float(np.sum(batch.scores["fake_heuristic"])) / len(batch)) * 100
     final_score = (heuristic_score * 0.6) + (avg_model_prob * 100 * 0.4)
     
     return {
         "fake_score": min(100, round(final_score, 2)),
-        "flagged_count": len(flagged),
-        "total_reviews": len(reviews)
+        "flagged_count": int(np.count_nonzero(batch.scores["fake_flagged"])),
+        "total_reviews": len(batch)
     }
+
+if __name__ == "__main__":
+    # Usage (from the truthlens directory):
+    #   python -m core.fake_review labeled_reviews.jsonl --epochs 3
+    parser = argparse.ArgumentParser(description="Train the fake-review classifier out-of-core.")
+    parser.add_argument("path", help="Labeled reviews (.jsonl or .csv)")
+    parser.add_argument("--out", default=MODEL_PATH)
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--chunk-size", type=int, default=10000)
+    parser.add_argument("--holdout-pct", type=int, default=5)
+    parser.add_argument("--checkpoint-every", type=int, default=50)
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--label-field", default="label")
+    parser.add_argument("--resume", action="store_true", help="Continue from the last checkpoint")
+    args = parser.parse_args()
+    train_streaming(
+        args.path,
+        out_path=args.out,
+        epochs=args.epochs,
+        chunk_size=args.chunk_size,
+        holdout_pct=args.holdout_pct,
+        checkpoint_every=args.checkpoint_every,
+        text_field=args.text_field,
+        label_field=args.label_field,
+        resume=args.resume
+    )
@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import threading
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+from .reviews import ReviewBatch
+
+DB_PATH = os.environ.get(
+    "TRUTHLENS_HISTORY_DB",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "history.sqlite")
+)
+
+AMAZON_ASIN_RE = re.compile(r"/(?:dp|gp/product|gp/aw/d|product-reviews|exec/obidos/asin)/([A-Z0-9]{10})(?:[/?]|$)", re.I)
+FLIPKART_ITEM_RE = re.compile(r"/p/(itm[a-z0-9]+)", re.I)
+# Short-link hosts that belong to one Amazon marketplace (amzn.to is global)
+AMAZON_SHORT_HOSTS = {"amzn.in": "amazon.in", "amzn.com": "amazon.com"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    product_id TEXT PRIMARY KEY,
+    source TEXT,
+    url TEXT,
+    title TEXT,
+    category TEXT,
+    price REAL,
+    rating TEXT,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS idx_products_category ON products(category);
+
+CREATE TABLE IF NOT EXISTS reviews (
+    product_id TEXT NOT NULL,
+    review_hash INTEGER NOT NULL,
+    text TEXT,
+    sentiment_label INTEGER,
+    sentiment_score REAL,
+    fake_flagged INTEGER,
+    fake_heuristic REAL,
+    fake_prob REAL,
+    first_seen REAL,
+    position INTEGER,
+    PRIMARY KEY (product_id, review_hash)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS snapshots (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_id TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    category TEXT,
+    price REAL,
+    input_hash TEXT,
+    review_count INTEGER,
+    overall_score REAL,
+    sentiment_score REAL,
+    fake_score REAL,
+    price_label TEXT,
+    image_quality REAL,
+    results_json TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_product_time ON snapshots(product_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_snapshots_category ON snapshots(category);
+CREATE INDEX IF NOT EXISTS idx_snapshots_time ON snapshots(created_at);
+
+CREATE TABLE IF NOT EXISTS product_aliases (
+    alias TEXT PRIMARY KEY,
+    product_id TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Per-review stage arrays persisted alongside each review
+REVIEW_SCORE_COLUMNS = ("sentiment_label", "sentiment_score", "fake_flagged", "fake_heuristic", "fake_prob")
+
+def canonical_product_id(url):
+    """
+    Maps differently formatted product URLs to one ID, e.g.
+    "amazon.in:B08N5WRWNW" or "flipkart:itmabc123". Amazon IDs include the
+    marketplace, since the same ASIN on amazon.in and amazon.com has
+    different prices and reviews. Flipkart items are keyed
+    by the itm path ID; the ?pid= ID is only used when the URL has no itm
+    path (HistoryStore.resolve_product_id maps those back to the itm ID
+    once seen together). Returns None if unknown.
+    """
+    if not url:
+        return None
+    parsed = urlparse(url.strip())
+    host = parsed.netloc.lower()
+
+    if "amazon" in host or "amzn" in host:
+        marketplace = _amazon_marketplace(host)
+        match = AMAZON_ASIN_RE.search(parsed.path)
+        if match and marketplace:
+            return f"{marketplace}:{match.group(1).upper()}"
+    elif "flipkart" in host:
+        match = FLIPKART_ITEM_RE.search(parsed.path)
+        if match:
+            return f"flipkart:{match.group(1).lower()}"
+        return _flipkart_pid_id(parsed)
+    return None
+
+def _amazon_marketplace(host):
+    # "www.amazon.co.uk" -> "amazon.co.uk"; None if the host has no marketplace
+    host = host.split(":")[0]
+    if host in AMAZON_SHORT_HOSTS:
+        return AMAZON_SHORT_HOSTS[host]
+    start = host.find("amazon.")
+    return host[start:] if start >= 0 else None
+
+def _flipkart_pid_id(parsed):
+    pid = parse_qs(parsed.query).get("pid")
+    return f"flipkart:{pid[0].upper()}" if pid else None
+
+def _json_default(value):
+    # NumPy scalars (e.g. np.bool_ from vision) are not JSON serializable
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def _signed_hashes(hashes):
+    # SQLite integers are signed 64-bit
+    return np.asarray(hashes, dtype=np.uint64).view(np.int64).tolist()
+
+
+class HistoryStore:
+    """
+    SQLite-backed store of scraped products, per-review stage results and
+    analysis snapshots, keyed by canonical product ID.
+    """
+
+    def __init__(self, path=DB_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # One connection shared across Streamlit threads, guarded by a lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.executescript(SCHEMA)
+            self._migrate()
+
+    def _migrate(self):
+        # Older databases keyed Amazon products without the marketplace
+        # ("amazon:ASIN") and stored missing ratings as the string 'None'
+        rows = self.conn.execute("SELECT product_id, url FROM products WHERE product_id LIKE 'amazon:%'").fetchall()
+        for row in rows:
+            new_id = canonical_product_id(row["url"])
+            if new_id is None or new_id == row["product_id"]:
+                continue
+            for table in ("products", "reviews", "snapshots"):
+                self.conn.execute(f"UPDATE OR REPLACE {table} SET product_id = ? WHERE product_id = ?",
+                                  (new_id, row["product_id"]))
+        self.conn.execute("UPDATE products SET rating = NULL WHERE rating = 'None'")
+
+    def resolve_product_id(self, url):
+        """
+        canonical_product_id, except that a Flipkart ?pid= ID already seen
+        alongside an itm path ID resolves to the itm ID.
+        """
+        product_id = canonical_product_id(url)
+        if product_id is None:
+            return None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT product_id FROM product_aliases WHERE alias = ?", (product_id,)
+            ).fetchone()
+        return row["product_id"] if row else product_id
+
+    def save_scrape(self, url, data, category=None):
+        """
+        Upserts the scraped product fields and stores any new review texts.
+        Returns the product ID, or None if the URL has no canonical ID.
+        """
+        product_id = self.resolve_product_id(url)
+        if product_id is None or not data or "error" in data:
+            return None
+
+        now = time.time()
+        reviews = [r for r in data.get("reviews", []) if r and r.strip()]
+        batch = ReviewBatch(reviews)
+        # A URL with both IDs links the pid to the itm ID for pid-only URLs
+        alias = _flipkart_pid_id(urlparse(url.strip())) if product_id.startswith("flipkart:itm") else None
+        with self.lock, self.conn:
+            if alias:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO product_aliases (alias, product_id) VALUES (?, ?)",
+                    (alias, product_id)
+                )
+            self.conn.execute(
+                """INSERT INTO products (product_id, source, url, title, category, price, rating, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(product_id) DO UPDATE SET
+                       source = excluded.source, url = excluded.url, title = excluded.title,
+                       category = COALESCE(excluded.category, products.category),
+                       price = excluded.price, rating = excluded.rating, updated_at = excluded.updated_at""",
+                (product_id, data.get("source"), url, data.get("title"), category,
+                 float(data.get("price") or 0.0),
+                 None if data.get("rating") is None else str(data.get("rating")), now)
+            )
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO reviews (product_id, review_hash, text, first_seen, position) VALUES (?, ?, ?, ?, ?)",
+                [(product_id, h, text, now, i) for i, (h, text) in enumerate(zip(_signed_hashes(batch.hashes), batch.text))]
+            )
+        return product_id
+
+    def load_product(self, product_id):
+        """
+        Returns stored product fields and review texts in the scrape_product format.
+        """
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM products WHERE product_id = ?", (product_id,)).fetchone()
+            if row is None:
+                return None
+            reviews = [r["text"] for r in self.conn.execute(
+                "SELECT text FROM reviews WHERE product_id = ? ORDER BY first_seen, position", (product_id,)
+            )]
+        return {
+            "title": row["title"],
+            "price": row["price"],
+            "rating": row["rating"],
+            "reviews": reviews,
+            "source": row["source"],
+            "product_id": product_id
+        }
+
+    def load_review_scores(self, product_id, hashes):
+        """
+        Returns {review_hash: {column: value}} for reviews of this product that
+        already have stage results stored.
+        """
+        signed = _signed_hashes(hashes)
+        found = {}
+        with self.lock:
+            # Chunked to stay under SQLite's bound-parameter limit
+            for start in range(0, len(signed), 500):
+                chunk = signed[start:start + 500]
+                rows = self.conn.execute(
+                    f"""SELECT review_hash, {", ".join(REVIEW_SCORE_COLUMNS)} FROM reviews
+                        WHERE product_id = ? AND sentiment_label IS NOT NULL
+                        AND review_hash IN ({", ".join("?" * len(chunk))})""",
+                    [product_id] + chunk
+                )
+                for row in rows:
+                    found[row["review_hash"]] = {c: row[c] for c in REVIEW_SCORE_COLUMNS}
+        return found
+
+    def save_analysis(self, product_id, batch, results, category=None, price=None, input_hash=None):
+        """
+        Stores per-review stage results and a snapshot of the full analysis.
+        """
+        now = time.time()
+        hashes = _signed_hashes(batch.hashes)
+        columns = [batch.scores[c].tolist() for c in REVIEW_SCORE_COLUMNS]
+        summary = {k: results[k] for k in ("sentiment", "fake", "price", "vision")}
+
+        with self.lock, self.conn:
+            self.conn.executemany(
+                f"""INSERT INTO reviews (product_id, review_hash, text, first_seen, position, {", ".join(REVIEW_SCORE_COLUMNS)})
+                    VALUES (?, ?, ?, ?, ?, {", ".join("?" * len(REVIEW_SCORE_COLUMNS))})
+                    ON CONFLICT(product_id, review_hash) DO UPDATE SET
+                    {", ".join(f"{c} = excluded.{c}" for c in REVIEW_SCORE_COLUMNS)}""",
+                [(product_id, h, text, now, i, *values)
+                 for i, (h, text, *values) in enumerate(zip(hashes, batch.text, *columns))]
+            )
+            self.conn.execute(
+                """INSERT INTO snapshots (product_id, created_at, category, price, input_hash, review_count,
+                       overall_score, sentiment_score, fake_score, price_label, image_quality, results_json)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (product_id, now, category, price, input_hash, len(batch), results["overall_score"],
+                 results["sentiment"]["overall_score"], results["fake"]["fake_score"],
+                 results["price"]["label"], results["vision"].get("quality_score", 0),
+                 json.dumps(summary, default=_json_default))
+            )
+
+    def latest_snapshot(self, product_id, max_age=None):
+        """
+        Returns the most recent analysis for a product, or None if there is
+        none (or it is older than max_age seconds).
+        """
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT * FROM snapshots WHERE product_id = ? ORDER BY created_at DESC LIMIT 1", (product_id,)
+            ).fetchone()
+        if row is None or (max_age is not None and time.time() - row["created_at"] > max_age):
+            return None
+        snapshot = dict(row)
+        snapshot.update(json.loads(snapshot.pop("results_json")))
+        return snapshot
+
+    def product_trend(self, product_id, limit=100):
+        """
+        Returns (created_at, overall, sentiment, fake, price, review_count)
+        rows for a product, oldest first, straight from the snapshot index.
+        """
+        with self.lock:
+            rows = self.conn.execute(
+                """SELECT created_at, overall_score, sentiment_score, fake_score, price, review_count
+                   FROM (SELECT * FROM snapshots WHERE product_id = ? ORDER BY created_at DESC LIMIT ?)
+                   ORDER BY created_at""",
+                (product_id, limit)
+            ).fetchall()
+        return [dict(r) for r in rows]
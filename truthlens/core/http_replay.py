@@ -0,0 +1,316 @@
+import os
+import json
+import math
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+
+# "live" hits the real sites, "record" also saves every response,
+# "replay" serves saved responses from a local ReplayServer.
+HTTP_MODE = os.environ.get("TRUTHLENS_HTTP_MODE", "live")
+RECORDINGS_DIR = os.environ.get(
+    "TRUTHLENS_RECORDINGS",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "recordings")
+)
+REPLAY_URL = os.environ.get("TRUTHLENS_REPLAY_URL", "http://127.0.0.1:8765")
+
+BOT_WALL_PAGE = b"""<html><head><title>Robot Check</title></head>
+<body><h4>Enter the characters you see below</h4>
+<p>Sorry, we just need to make sure you're not a robot.</p></body></html>"""
+
+def set_mode(mode, recordings_dir=None, replay_url=None):
+    """
+    Switches between "live", "record" and "replay" at runtime.
+    """
+    global HTTP_MODE, RECORDINGS_DIR, REPLAY_URL
+    if mode not in ("live", "record", "replay"):
+        raise ValueError(f"Unknown HTTP mode: {mode}")
+    HTTP_MODE = mode
+    if recordings_dir:
+        RECORDINGS_DIR = recordings_dir
+    if replay_url:
+        REPLAY_URL = replay_url.rstrip("/")
+
+def recording_key(url):
+    return hashlib.sha1(url.encode("utf-8")).hexdigest()
+
+def save_recording(url, status, content, content_type="text/html", recordings_dir=None):
+    """
+    Saves one request/response pair as a JSON file named by the URL hash.
+    """
+    recordings_dir = recordings_dir or RECORDINGS_DIR
+    os.makedirs(recordings_dir, exist_ok=True)
+    record = {
+        "url": url,
+        "status": status,
+        "content_type": content_type,
+        "body": base64.b64encode(content).decode("ascii"),
+        "recorded_at": time.time()
+    }
+    path = os.path.join(recordings_dir, recording_key(url) + ".json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f)
+    return path
+
+def load_recording(key, recordings_dir=None):
+    path = os.path.join(recordings_dir or RECORDINGS_DIR, key + ".json")
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        record = json.load(f)
+    record["body"] = base64.b64decode(record["body"])
+    return record
+
+def parsed_fields(result):
+    """
+    The parts of a scrape result that offline regression tests compare.
+    """
+    return {
+        "title": result.get("title"),
+        "price": result.get("price"),
+        "review_count": len(result.get("reviews", []))
+    }
+
+def save_expected(url, result, recordings_dir=None):
+    """
+    Stores what the scraper parsed from a recorded page next to the
+    recording, so later replays can check parsing still gives the same.
+    """
+    path = os.path.join(recordings_dir or RECORDINGS_DIR, recording_key(url) + ".json")
+    with open(path, encoding="utf-8") as f:
+        record = json.load(f)
+    record["expected"] = parsed_fields(result)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(record, f)
+
+def load_expected(urls, recordings_dir=None):
+    """
+    Returns {url: expected parsed fields} for recordings that have them.
+    """
+    expected = {}
+    for url in urls:
+        record = load_recording(recording_key(url), recordings_dir)
+        if record and record.get("expected"):
+            expected[url] = record["expected"]
+    return expected
+
+def fetch(url, headers=None, timeout=10):
+    """
+    Drop-in replacement for requests.get used by the scrapers.
+    Behaves according to HTTP_MODE.
+    """
+    if HTTP_MODE == "replay":
+        return requests.get(f"{REPLAY_URL}/replay/{recording_key(url)}", headers=headers, timeout=timeout)
+
+    response = requests.get(url, headers=headers, timeout=timeout)
+    if HTTP_MODE == "record":
+        save_recording(url, response.status_code, response.content, response.headers.get("Content-Type", "text/html"))
+    return response
+
+
+class _ReplayHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        if not self.path.startswith("/replay/"):
+            self._send(404, b"Not found")
+            return
+
+        key = self.path[len("/replay/"):].split("?")[0]
+        record = server.get_record(key)
+        if record is None:
+            server.count("missing")
+            self._send(404, b"No recording for this URL")
+            return
+
+        with server.lock:
+            latency = server.rng.uniform(*server.latency)
+            roll = server.rng.random()
+
+        if latency:
+            time.sleep(latency)
+
+        # Fault injection: 429, 503 and bot walls, in that order of rolls
+        if roll < server.rate_limit_rate:
+            server.count("429")
+            self._send(429, b"Too Many Requests", extra_headers={"Retry-After": "1"})
+        elif roll < server.rate_limit_rate + server.unavailable_rate:
+            server.count("503")
+            self._send(503, b"Service Unavailable")
+        elif roll < server.rate_limit_rate + server.unavailable_rate + server.bot_wall_rate:
+            server.count("bot_wall")
+            self._send(200, BOT_WALL_PAGE)
+        else:
+            server.count("served")
+            self._send(record["status"], record["body"], record.get("content_type", "text/html"))
+
+    def _send(self, status, body, content_type="text/html", extra_headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (extra_headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Keep load tests quiet
+        pass
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """
+    Local stand-in retail server that serves recorded pages concurrently,
+    with configurable latency and injected 429/503/bot-wall responses.
+    """
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=8765, recordings_dir=None, latency=(0.0, 0.0),
+                 rate_limit_rate=0.0, unavailable_rate=0.0, bot_wall_rate=0.0, seed=0):
+        super().__init__((host, port), _ReplayHandler)
+        self.recordings_dir = recordings_dir or RECORDINGS_DIR
+        self.latency = latency if isinstance(latency, (tuple, list)) else (latency, latency)
+        self.rate_limit_rate = rate_limit_rate
+        self.unavailable_rate = unavailable_rate
+        self.bot_wall_rate = bot_wall_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {}
+        self._records = {}
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def get_record(self, key):
+        # Recordings are read from disk once, then served from memory
+        if key not in self._records:
+            self._records[key] = load_recording(key, self.recordings_dir)
+        return self._records[key]
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def start(self):
+        """
+        Serves in a background thread and returns the server.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def _percentile(sorted_values, q):
+    # Nearest-rank percentile: the smallest value with at least q of the samples at or below it
+    if not sorted_values:
+        return 0.0
+    return round(sorted_values[max(0, math.ceil(q * len(sorted_values)) - 1)], 4)
+
+def run_load_test(urls, concurrency=8, expected=None):
+    """
+    Scrapes every URL with bounded concurrency and reports throughput,
+    latency percentiles and how many pages parsed vs fell back.
+    `expected` optionally maps url -> parsed_fields() from recording time
+    (see load_expected) to check parsing correctness. Only pages that
+    parsed are compared; injected failures show up as fallbacks.
+    """
+    from .scraping import scrape_product
+
+    def timed_scrape(url):
+        start = time.perf_counter()
+        result = scrape_product(url)
+        return url, result, time.perf_counter() - start
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed_scrape, urls))
+    elapsed = time.perf_counter() - start_time
+
+    latencies = sorted(r[2] for r in results)
+    parsed = 0
+    mismatches = []
+    for url, result, _ in results:
+        if "Fallback" in result.get("source", "Fallback"):
+            continue
+        parsed += 1
+        want = (expected or {}).get(url)
+        got = parsed_fields(result)
+        if want and any(got.get(field) != value for field, value in want.items()):
+            mismatches.append({"url": url, "expected": want, "got": got})
+
+    return {
+        "requests": len(results),
+        "seconds": round(elapsed, 3),
+        "requests_per_sec": round(len(results) / elapsed, 2) if elapsed else 0.0,
+        "p50_latency": _percentile(latencies, 0.50),
+        "p95_latency": _percentile(latencies, 0.95),
+        "parsed": parsed,
+        "fallbacks": len(results) - parsed,
+        "mismatches": mismatches
+    }
+
+
+if __name__ == "__main__":
+    # Usage (from the truthlens directory):
+    #   python -m core.http_replay record urls.txt
+    #   python -m core.http_replay serve --latency 0.05 --rate-limit 0.1
+    #   python -m core.http_replay bench urls.txt --concurrency 16 --bot-wall 0.05
+    parser = argparse.ArgumentParser(description="Record/replay HTTP for offline scraper testing.")
+    parser.add_argument("command", choices=["record", "serve", "bench"])
+    parser.add_argument("urls", nargs="?", help="File with one product URL per line")
+    parser.add_argument("--recordings", default=RECORDINGS_DIR)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Max injected latency in seconds")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Fraction of 429 responses")
+    parser.add_argument("--unavailable", type=float, default=0.0, help="Fraction of 503 responses")
+    parser.add_argument("--bot-wall", type=float, default=0.0, help="Fraction of bot-wall pages")
+    parser.add_argument("--concurrency", type=int, default=8)
+    args = parser.parse_args()
+
+    urls = []
+    if args.urls:
+        with open(args.urls, encoding="utf-8") as f:
+            urls = [line.strip() for line in f if line.strip()]
+
+    if args.command == "record":
+        from .scraping import scrape_product
+        set_mode("record", recordings_dir=args.recordings)
+        for url in urls:
+            result = scrape_product(url)
+            if "Fallback" in result.get("source", "Fallback"):
+                # Nothing was parsed, so there is no baseline to check replays against
+                print(f"Recorded {url} without expected fields (scraper fell back)")
+                continue
+            save_expected(url, result, args.recordings)
+            print(f"Recorded {url}: {result.get('title')}")
+    else:
+        server = ReplayServer(
+            port=args.port,
+            recordings_dir=args.recordings,
+            latency=(0.0, args.latency),
+            rate_limit_rate=args.rate_limit,
+            unavailable_rate=args.unavailable,
+            bot_wall_rate=args.bot_wall
+        )
+        if args.command == "serve":
+            print(f"Replaying recordings from {args.recordings} on {server.url}")
+            server.serve_forever()
+        else:
+            server.start()
+            set_mode("replay", recordings_dir=args.recordings, replay_url=server.url)
+            expected = load_expected(urls, args.recordings)
+            print(json.dumps(run_load_test(urls, args.concurrency, expected), indent=2))
+            print(f"Server stats: {server.stats}")
+            server.stop()
@@ -0,0 +1,591 @@
+import os
+import re
+import json
+import zlib
+import threading
+from contextlib import contextmanager
+import numpy as np
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+# Size of the hashed feature vector used for title/spec similarity.
+# 128 float32 dims keeps 1M products at ~512MB, small enough to memory-map.
+FEATURE_DIM = 128
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# On-disk columns: raw little-endian arrays that are only ever appended to
+COLUMNS = {
+    "prices": ("prices.f32", np.float32),
+    "scores": ("scores.f32", np.float32),
+    "category_codes": ("category_codes.i16", np.int16)
+}
+VECTORS_FILE = "vectors.f32"
+PARTITIONS_FILE = "partitions.npz"
+LOCK_FILE = "index.lock"
+
+# Below this many rows a full scan is already fast; partitions are not worth building
+PARTITION_MIN_ROWS = 50_000
+
+def _append(path, offset, data):
+    """
+    Appends bytes at `offset`, first dropping anything past it (left over
+    from a save that crashed before meta.json was updated).
+    """
+    mode = "r+b" if os.path.exists(path) else "wb"
+    with open(path, mode) as f:
+        f.truncate(offset)
+        f.seek(offset)
+        f.write(data)
+        return f.tell()
+
+@contextmanager
+def _file_lock(path, exclusive=True):
+    """
+    Cross-process lock on an index directory, so the app and a crawler can
+    share one index. save() takes it exclusive, loads take it shared.
+    """
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, LOCK_FILE), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        else:
+            # msvcrt only has exclusive locks
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def _meta_stamp(path):
+    # Cheap change check: meta.json is replaced (new inode/mtime) on every save
+    try:
+        st = os.stat(os.path.join(path, "meta.json"))
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+def hash_features(text, dim=FEATURE_DIM):
+    """
+    Converts text into a fixed-size, L2-normalized hashed bag-of-words vector.
+    Uses crc32 instead of hash() so vectors stay stable across processes.
+    """
+    vec = np.zeros(dim, dtype=np.float32)
+    for token in TOKEN_RE.findall((text or "").lower()):
+        h = zlib.crc32(token.encode("utf-8"))
+        # Signed hashing reduces the bias from bucket collisions
+        vec[h % dim] += 1.0 if (h >> 31) & 1 else -1.0
+    norm = np.linalg.norm(vec)
+    if norm > 0:
+        vec /= norm
+    return vec
+
+
+class ProductIndex:
+    """
+    Columnar store of analyzed products for "similar but better" lookups.
+    Each product is one row across compact NumPy arrays: a hashed title/spec
+    vector, a category code, the price and the overall score.
+
+    Saved rows are memory-mapped from disk; rows added since the last save
+    live in an in-memory tail and are appended to the files by save().
+    Several processes (e.g. the app and a crawler) can share one index
+    directory: save() merges with whatever others saved in the meantime,
+    and query() picks up their rows when meta.json changes.
+    """
+
+    def __init__(self, path=None, dim=FEATURE_DIM, capacity=1024, mmap=True):
+        self.mmap = mmap
+        self.dim = dim
+        self._capacity = capacity
+        # One index is shared across Streamlit sessions
+        self.lock = threading.RLock()
+        self._reset(path)
+
+        if path and os.path.exists(os.path.join(path, "meta.json")):
+            self.load(path, mmap=mmap)
+
+    def _reset(self, path):
+        self.path = path
+        self.size = 0
+        self.prices = np.zeros(self._capacity, dtype=np.float32)
+        self.scores = np.zeros(self._capacity, dtype=np.float32)
+        self.category_codes = np.zeros(self._capacity, dtype=np.int16)
+        self.categories = []
+        self.titles = []
+        # Lookup tables so add/query stay O(1) per product at 1M rows
+        self._rows = {}
+        self._category_ids = {}
+        # Vectors of saved rows (memory-mapped, or a growable buffer without
+        # mmap) and of unsaved rows
+        self._mapped = np.zeros((0, self.dim), dtype=np.float32)
+        self._saved_buffer = None
+        self._tail = np.zeros((self._capacity, self.dim), dtype=np.float32)
+        self._saved_size = 0
+        self._titles_bytes = 0
+        self._dirty_rows = set()
+        # On-disk state this instance last synced with
+        self._version = 0
+        self._patches = 0
+        self._stamp = None
+        # Optional IVF partition over saved rows: rows of list i are
+        # _list_rows[_list_offsets[i]:_list_offsets[i + 1]]
+        self.centroids = None
+        self._list_offsets = None
+        self._list_rows = None
+        self._partitioned_size = 0
+        self._partition_version = 0
+        self._partitions_dirty = False
+
+    def _grow(self, needed):
+        capacity = len(self.prices)
+        if needed > capacity:
+            new_capacity = max(needed, capacity * 2)
+            for name in COLUMNS:
+                old = getattr(self, name)
+                arr = np.zeros(new_capacity, dtype=old.dtype)
+                arr[:self.size] = old[:self.size]
+                setattr(self, name, arr)
+
+        tail_needed = needed - self._saved_size
+        if tail_needed > len(self._tail):
+            tail = np.zeros((max(tail_needed, len(self._tail) * 2), self.dim), dtype=np.float32)
+            tail[:self.size - self._saved_size] = self._tail[:self.size - self._saved_size]
+            self._tail = tail
+
+    def _extend_saved(self, vectors):
+        # Without mmap, saved vectors live in a buffer grown geometrically
+        # so each save copies only the new rows
+        needed = self._saved_size + len(vectors)
+        if self._saved_buffer is None or len(self._saved_buffer) < needed:
+            buffer = np.zeros((max(needed, 2 * self._saved_size, self._capacity), self.dim), dtype=np.float32)
+            buffer[:self._saved_size] = self._mapped[:self._saved_size]
+            self._saved_buffer = buffer
+        self._saved_buffer[self._saved_size:needed] = vectors
+        self._saved_size = needed
+        self._mapped = self._saved_buffer[:needed]
+
+    def _category_code(self, category):
+        if category not in self._category_ids:
+            self._category_ids[category] = len(self.categories)
+            self.categories.append(category)
+        return self._category_ids[category]
+
+    def _set_vector(self, row, vector):
+        if row < self._saved_size:
+            self._mapped[row] = vector
+        else:
+            self._tail[row - self._saved_size] = vector
+
+    def _vectors(self, rows):
+        rows = np.asarray(rows)
+        saved = rows < self._saved_size
+        out = np.empty((len(rows), self.dim), dtype=np.float32)
+        out[saved] = self._mapped[rows[saved]]
+        out[~saved] = self._tail[rows[~saved] - self._saved_size]
+        return out
+
+    def _similarities(self, query_vec):
+        return np.concatenate([
+            self._mapped @ query_vec,
+            self._tail[:self.size - self._saved_size] @ query_vec
+        ])
+
+    def add(self, title, category, price, score, specs_text=""):
+        """
+        Adds an analyzed product to the index. Returns its row id.
+        If the same title was already indexed, the row is updated in place.
+        """
+        vector = hash_features(f"{title} {specs_text}", self.dim)
+        with self.lock:
+            return self._put(title, category, price, score, vector)
+
+    def _put(self, title, category, price, score, vector):
+        if title in self._rows:
+            row = self._rows[title]
+            if row < self._saved_size:
+                self._dirty_rows.add(row)
+        else:
+            self._grow(self.size + 1)
+            row = self.size
+            self.size += 1
+            self.titles.append(title)
+            self._rows[title] = row
+
+        self._set_vector(row, vector)
+        self.prices[row] = price
+        self.scores[row] = score
+        self.category_codes[row] = self._category_code(category)
+        return row
+
+    def _pending(self, all_rows=False):
+        # Unsaved changes as (title, category, price, score, vector), so they
+        # can be replayed on top of a fresh copy of the on-disk rows
+        rows = range(self.size) if all_rows else sorted(self._dirty_rows) + list(range(self._saved_size, self.size))
+        return [
+            (self.titles[row], self.categories[self.category_codes[row]], float(self.prices[row]),
+             float(self.scores[row]), self._vectors([row])[0])
+            for row in rows
+        ]
+
+    def build_partitions(self, n_lists=256, iterations=10, sample_size=65536, seed=0):
+        """
+        Builds a simple IVF partition over the saved rows: spherical k-means
+        on a sample, then every row is assigned to its closest centroid.
+        Queries then scan only the closest lists (plus rows added later).
+        The heavy work runs without holding the index lock; call save()
+        afterwards to share the partition with other processes.
+        """
+        with self.lock:
+            n = self._saved_size
+            vectors = self._mapped
+
+        if n < n_lists * 4:
+            # Too few rows for partitioning to pay off
+            with self.lock:
+                self.centroids = self._list_offsets = self._list_rows = None
+                self._partitioned_size = 0
+                self._partitions_dirty = True
+            return
+
+        rng = np.random.default_rng(seed)
+        sample = np.asarray(vectors[np.sort(rng.choice(n, min(n, sample_size), replace=False))])
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            norms = np.linalg.norm(sums, axis=1)
+            # Empty lists keep their previous centroid
+            filled = norms > 0
+            centroids[filled] = sums[filled] / norms[filled, None]
+
+        assignments = np.empty(n, dtype=np.int32)
+        for start in range(0, n, 65536):
+            chunk = np.asarray(vectors[start:start + 65536])
+            assignments[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+        list_rows = np.argsort(assignments, kind="stable").astype(np.int64)
+        list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assignments, minlength=n_lists))))
+
+        with self.lock:
+            if n > self._saved_size:
+                # The index was reloaded smaller in the meantime; rows no longer match
+                return
+            self.centroids = centroids
+            self._list_offsets = list_offsets
+            self._list_rows = list_rows
+            self._partitioned_size = n
+            self._partitions_dirty = True
+
+    def partitions_stale(self, min_rows=PARTITION_MIN_ROWS, max_unpartitioned=0.1):
+        """
+        True if the index is large enough for partitions and they are missing
+        or more than `max_unpartitioned` of the rows were added since.
+        """
+        with self.lock:
+            if self.size < min_rows:
+                return False
+            return self._list_rows is None or self.size - self._partitioned_size > max_unpartitioned * self.size
+
+    def _filter(self, rows, min_score, price_range, category_code, exclude_row):
+        # Cheap scalar filters; rows=None means all rows
+        n = self.size
+        scores = self.scores[:n] if rows is None else self.scores[rows]
+        prices = self.prices[:n] if rows is None else self.prices[rows]
+        mask = np.ones(len(scores), dtype=bool)
+        if min_score is not None:
+            mask &= scores > min_score
+        if price_range is not None:
+            low, high = price_range
+            mask &= (prices >= low) & (prices <= high)
+        if category_code is not None:
+            codes = self.category_codes[:n] if rows is None else self.category_codes[rows]
+            mask &= codes == category_code
+        if exclude_row is not None:
+            if rows is None:
+                mask[exclude_row] = False
+            else:
+                mask &= rows != exclude_row
+        return mask
+
+    def _top_k(self, candidates, query_vec, k, dense):
+        if len(candidates) == 0:
+            return []
+        if dense:
+            # Dense scan is cheaper than gathering most of the rows
+            sims = self._similarities(query_vec)[candidates]
+        else:
+            sims = self._vectors(candidates) @ query_vec
+        k = min(k, len(candidates))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+
+        results = []
+        for i in top:
+            row = candidates[i]
+            results.append({
+                "title": self.titles[row],
+                "category": self.categories[self.category_codes[row]],
+                "price": float(self.prices[row]),
+                "score": round(float(self.scores[row]), 1),
+                "similarity": round(float(sims[i]), 3)
+            })
+        return results
+
+    def query(self, title, specs_text="", k=5, min_score=None, price_range=None,
+              category=None, n_probe=8, exclude_title=True):
+        """
+        Returns the top-k most similar products (cosine similarity) that
+        satisfy the score, price band and category filters.
+        With partitions, only the n_probe closest lists are scanned; if that
+        yields fewer than k matches, the query falls back to a full scan.
+        """
+        query_vec = hash_features(f"{title} {specs_text}", self.dim)
+        self.refresh()
+        with self.lock:
+            if self.size == 0:
+                return []
+            n = self.size
+
+            category_code = None
+            if category is not None:
+                if category not in self._category_ids:
+                    return []
+                category_code = self._category_ids[category]
+            exclude_row = self._rows.get(title) if exclude_title else None
+            filters = (min_score, price_range, category_code, exclude_row)
+
+            if self._list_rows is not None:
+                probe = min(n_probe, len(self.centroids))
+                closest = np.argpartition(-(self.centroids @ query_vec), probe - 1)[:probe]
+                # Rows added after the partition was built are always scanned
+                rows = np.concatenate(
+                    [self._list_rows[self._list_offsets[c]:self._list_offsets[c + 1]] for c in closest]
+                    + [np.arange(self._partitioned_size, n)]
+                )
+                candidates = np.sort(rows[self._filter(rows, *filters)])
+                results = self._top_k(candidates, query_vec, k, dense=False)
+                if len(results) >= k:
+                    return results
+
+            candidates = np.flatnonzero(self._filter(None, *filters))
+            return self._top_k(candidates, query_vec, k, dense=len(candidates) > n // 4)
+
+    def refresh(self):
+        """
+        Picks up rows other processes saved since this index was last loaded
+        or saved. Unsaved local changes are kept. Returns True if it reloaded.
+        """
+        if not self.path:
+            return False
+        stamp = _meta_stamp(self.path)
+        if stamp is None or stamp == self._stamp:
+            return False
+        with self.lock, _file_lock(self.path, exclusive=False):
+            meta = _read_meta(self.path)
+            if meta is None or meta.get("version", 0) == self._version:
+                self._stamp = stamp
+                return False
+            self._sync(self.path, meta)
+            return True
+
+    def _sync(self, path, meta):
+        """
+        Replaces the in-memory saved rows with what is on disk at `path` and
+        replays unsaved local changes on top. Caller holds the file lock.
+        """
+        pending = self._pending(all_rows=path != self.path)
+        if path != self.path or meta is None or meta["size"] < self._saved_size:
+            self._reset(path)
+        if meta is not None:
+            self._read_disk(path, meta)
+        for item in pending:
+            self._put(*item)
+
+    def _read_disk(self, path, meta):
+        # Rows up to _saved_size are already in memory; only newer ones are read
+        size = meta["size"]
+        if meta["dim"] != self.dim:
+            self.dim = meta["dim"]
+            self._tail = np.zeros((self._capacity, self.dim), dtype=np.float32)
+            self._mapped = np.zeros((0, self.dim), dtype=np.float32)
+        old_size = self._saved_size
+
+        capacity = max(size, len(self.prices))
+        for name, (filename, dtype) in COLUMNS.items():
+            # Scalar columns are small; re-read in full to see in-place updates
+            column = np.zeros(capacity, dtype=dtype)
+            column[:size] = np.fromfile(os.path.join(path, filename), dtype=dtype, count=size)
+            setattr(self, name, column)
+
+        with open(os.path.join(path, "titles.jsonl"), "rb") as f:
+            f.seek(self._titles_bytes)
+            data = f.read(meta["titles_bytes"] - self._titles_bytes)
+        # Unsaved local rows are dropped here; _sync replays them afterwards
+        for title in self.titles[old_size:]:
+            del self._rows[title]
+        del self.titles[old_size:]
+        for line in data.splitlines():
+            title = json.loads(line)
+            self._rows[title] = len(self.titles)
+            self.titles.append(title)
+        self._titles_bytes = meta["titles_bytes"]
+        self.size = size
+
+        self.categories = list(meta["categories"])
+        self._category_ids = {cat: code for code, cat in enumerate(self.categories)}
+
+        if self.mmap:
+            self._map_vectors(path, size)
+        else:
+            if meta.get("patches", 0) != self._patches:
+                # Someone rewrote saved rows in place: re-read all vectors
+                self._saved_size = 0
+                self._saved_buffer = None
+                self._mapped = np.zeros((0, self.dim), dtype=np.float32)
+            start = self._saved_size
+            self._extend_saved(np.fromfile(
+                os.path.join(path, VECTORS_FILE), dtype=np.float32,
+                count=(size - start) * self.dim, offset=start * self.dim * 4
+            ).reshape(-1, self.dim))
+        self._tail = np.zeros((self._capacity, self.dim), dtype=np.float32)
+        self._dirty_rows = set()
+
+        if not self._partitions_dirty and meta.get("partition_version", 0) != self._partition_version:
+            self._load_partitions(path, meta)
+
+        self._version = meta.get("version", 0)
+        self._patches = meta.get("patches", 0)
+        self._stamp = _meta_stamp(path)
+
+    def _load_partitions(self, path, meta):
+        self.centroids = self._list_offsets = self._list_rows = None
+        self._partitioned_size = 0
+        self._partition_version = meta.get("partition_version", 0)
+        if os.path.exists(os.path.join(path, PARTITIONS_FILE)):
+            with np.load(os.path.join(path, PARTITIONS_FILE)) as parts:
+                self.centroids = parts["centroids"]
+                self._list_offsets = parts["list_offsets"]
+                self._list_rows = parts["list_rows"]
+                self._partitioned_size = int(parts["partitioned_size"])
+
+    def save(self, path=None):
+        """
+        Appends rows added since the last save to the on-disk columns and
+        writes back rows that were updated in place. Cost is proportional to
+        the number of changed rows, not the index size.
+
+        Runs under a cross-process file lock. If another process saved in
+        the meantime, its rows are loaded first and local changes are
+        appended after them (or update them, for the same title).
+        """
+        with self.lock:
+            path = path or self.path
+            with _file_lock(path):
+                meta = _read_meta(path)
+                if path != self.path or (meta or {}).get("version", 0) != self._version:
+                    self._sync(path, meta)
+                self._write(path)
+
+    def _write(self, path):
+        start, end = self._saved_size, self.size
+        patched = bool(self._dirty_rows)
+
+        # Rows updated in place are patched at their offsets
+        if self._dirty_rows:
+            rows = sorted(self._dirty_rows)
+            columns = [(VECTORS_FILE, self._mapped)] + [
+                (filename, getattr(self, name)) for name, (filename, _) in COLUMNS.items()
+            ]
+            for filename, column in columns:
+                with open(os.path.join(path, filename), "r+b") as f:
+                    for row in rows:
+                        f.seek(row * column[row].nbytes)
+                        f.write(np.ascontiguousarray(column[row:row + 1]).tobytes())
+
+        if end > start:
+            # start is the on-disk size (synced above), so nothing saved by others is overwritten
+            _append(os.path.join(path, VECTORS_FILE), start * self.dim * 4, self._tail[:end - start].tobytes())
+            for name, (filename, dtype) in COLUMNS.items():
+                _append(os.path.join(path, filename), start * np.dtype(dtype).itemsize,
+                        getattr(self, name)[start:end].tobytes())
+            titles = "".join(json.dumps(title) + "\n" for title in self.titles[start:end])
+            self._titles_bytes = _append(os.path.join(path, "titles.jsonl"), self._titles_bytes,
+                                         titles.encode("utf-8"))
+
+        if self._partitions_dirty:
+            partitions_path = os.path.join(path, PARTITIONS_FILE)
+            if self._list_rows is not None:
+                tmp = partitions_path + ".tmp"
+                with open(tmp, "wb") as f:
+                    np.savez(f, centroids=self.centroids, list_offsets=self._list_offsets,
+                             list_rows=self._list_rows, partitioned_size=self._partitioned_size)
+                os.replace(tmp, partitions_path)
+            elif os.path.exists(partitions_path):
+                os.remove(partitions_path)
+            self._partition_version += 1
+            self._partitions_dirty = False
+
+        # meta.json is written last: rows beyond its size are ignored on load
+        self._version += 1
+        self._patches += patched
+        meta = {
+            "dim": self.dim,
+            "size": end,
+            "titles_bytes": self._titles_bytes,
+            "categories": self.categories,
+            "version": self._version,
+            "patches": self._patches,
+            "partition_version": self._partition_version
+        }
+        tmp = os.path.join(path, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp, os.path.join(path, "meta.json"))
+        self._stamp = _meta_stamp(path)
+
+        self._dirty_rows.clear()
+        if end > start:
+            # Newly appended rows now count as saved
+            if self.mmap:
+                self._map_vectors(path, end)
+            else:
+                self._extend_saved(self._tail[:end - start])
+            self._tail = np.zeros((self._capacity, self.dim), dtype=np.float32)
+
+    def _map_vectors(self, path, size):
+        self._saved_size = size
+        if size == 0:
+            self._mapped = np.zeros((0, self.dim), dtype=np.float32)
+            return
+        # r+ so in-place updates of saved rows go straight to the page cache
+        self._mapped = np.memmap(os.path.join(path, VECTORS_FILE), dtype=np.float32, mode="r+",
+                                 shape=(size, self.dim))
+
+    def load(self, path, mmap=True):
+        """
+        Loads a saved index. With mmap=True the vectors stay on disk and are
+        memory-mapped, which keeps startup fast for very large indexes.
+        """
+        with self.lock, _file_lock(path, exclusive=False):
+            self.mmap = mmap
+            self._reset(path)
+            meta = _read_meta(path)
+            if meta is not None:
+                self._read_disk(path, meta)
@@ -2,6 +2,8 @@ from transformers import pipeline
 import time
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 import torch
+import numpy as np
+from .reviews import ReviewBatch
 
 # Check for GPU (CUDA or ROCm)
 device = 0 if torch.cuda.is_available() else -1
@@ -17,12 +19,156 @@ except Exception as e:
 
 vader_analyzer = SentimentIntensityAnalyzer()
 
+# Long reviews are split into overlapping windows that fit the model's
+# token limit; consecutive windows share WINDOW_OVERLAP tokens.
+WINDOW_OVERLAP = 128
+INFERENCE_BATCH_SIZE = 32
+
+# Label codes used for the per-review sentiment array on ReviewBatch
+SENTIMENT_LABELS = ("NEGATIVE", "NEUTRAL", "POSITIVE")
+
+def _label_code(label):
+    label = label.upper() # Ensure uppercase
+    if label not in SENTIMENT_LABELS:
+        # Map transformer output (e.g., 'LABEL_1') if necessary, though distilbert uses POSITIVE/NEGATIVE
+        if 'POSITIVE' in label or 'LABEL_1' in label: label = 'POSITIVE'
+        elif 'NEGATIVE' in label or 'LABEL_0' in label: label = 'NEGATIVE'
+        else: label = 'NEUTRAL'
+    return SENTIMENT_LABELS.index(label)
+
+def _max_window_tokens(tokenizer, model):
+    """
+    Largest number of review tokens per window: the model's input limit
+    minus the special tokens ([CLS]/[SEP]) the tokenizer adds.
+    """
+    max_length = tokenizer.model_max_length
+    # Tokenizers without a configured limit report a huge sentinel value
+    max_positions = getattr(model.config, "max_position_embeddings", None)
+    if max_positions and max_length > max_positions:
+        max_length = max_positions
+    return max_length - tokenizer.num_special_tokens_to_add()
+
+def _with_special_tokens(tokenizer, ids):
+    """
+    Adds the model's special tokens around one window of token ids.
+    """
+    if hasattr(tokenizer, "build_inputs_with_special_tokens"):
+        return tokenizer.build_inputs_with_special_tokens(ids)
+    # transformers 5 dropped the method; [CLS] ids [SEP] is what DistilBERT adds
+    return [tokenizer.cls_token_id] + ids + [tokenizer.sep_token_id]
+
+def _token_windows(token_ids, max_tokens):
+    """
+    Splits each review's token ids into windows of at most max_tokens.
+    Short reviews stay as a single window. Returns the windows and the index
+    of the review each window belongs to.
+    """
+    windows = []
+    owners = []
+    step = max(1, max_tokens - WINDOW_OVERLAP)
+    for i, ids in enumerate(token_ids):
+        if len(ids) <= max_tokens:
+            windows.append(ids)
+            owners.append(i)
+            continue
+        for start in range(0, len(ids), step):
+            windows.append(ids[start:start + max_tokens])
+            owners.append(i)
+            if start + max_tokens >= len(ids):
+                break
+    return windows, np.array(owners, dtype=np.int64)
+
+def _chunked_sentiment(batch):
+    """
+    Runs the transformer on every window of every review, batching windows
+    from all reviews together, and averages window probabilities back per
+    review (weighted by window length).
+    """
+    tokenizer = sentiment_pipeline.tokenizer
+    model = sentiment_pipeline.model
+
+    # Tokenize once per batch; reused if the same batch is analyzed again
+    token_ids = batch.feature(
+        "sentiment_token_ids",
+        lambda b: tokenizer(b.text, add_special_tokens=False, truncation=False, verbose=False)["input_ids"]
+    )
+    windows, owners = _token_windows(token_ids, _max_window_tokens(tokenizer, model))
+
+    positive_id = model.config.label2id.get("POSITIVE", 1)
+    window_probs = np.zeros(len(windows), dtype=np.float32)
+    # Sorting by length keeps padding per inference batch small
+    order = np.argsort([len(w) for w in windows], kind="stable")
+
+    with torch.no_grad():
+        for start in range(0, len(order), INFERENCE_BATCH_SIZE):
+            idx = order[start:start + INFERENCE_BATCH_SIZE]
+            encoded = tokenizer.pad(
+                {"input_ids": [_with_special_tokens(tokenizer, windows[i]) for i in idx]},
+                return_tensors="pt"
+            )
+            encoded = {k: v.to(model.device) for k, v in encoded.items()}
+            logits = model(**encoded).logits
+            window_probs[idx] = torch.softmax(logits, dim=-1)[:, positive_id].float().cpu().numpy()
+
+    weights = np.array([len(w) for w in windows], dtype=np.float32)
+    weights = np.maximum(weights, 1.0) # Empty tokenizations still count once
+    totals = np.bincount(owners, weights=weights * window_probs, minlength=len(batch))
+    norms = np.bincount(owners, weights=weights, minlength=len(batch))
+    review_probs = totals / norms
+
+    return [
+        {"label": "POSITIVE", "score": float(p)} if p >= 0.5 else {"label": "NEGATIVE", "score": float(1 - p)}
+        for p in review_probs
+    ]
+
+def benchmark_long_reviews(reviews, repeats=3):
+    """
+    Compares throughput (reviews/sec) of the old 2000-character truncation
+    against token-aware chunking on the given corpus. Also reports the share
+    of review tokens each approach actually scores.
+    """
+    if not transformers_available:
+        return {"error": "Transformers pipeline unavailable"}
+
+    reviews = list(reviews)
+    timings = {}
+
+    tokenizer = sentiment_pipeline.tokenizer
+    max_tokens = _max_window_tokens(tokenizer, sentiment_pipeline.model)
+    full_lengths = [len(ids) for ids in tokenizer(reviews, add_special_tokens=False, verbose=False)["input_ids"]]
+    truncated_lengths = [
+        min(len(ids), max_tokens)
+        for ids in tokenizer([review[:2000] for review in reviews], add_special_tokens=False, verbose=False)["input_ids"]
+    ]
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        sentiment_pipeline([review[:2000] for review in reviews], truncation=True, batch_size=INFERENCE_BATCH_SIZE)
+    timings["truncated"] = (time.perf_counter() - start) / repeats
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        # Fresh batch each run so tokenization is included in the timing
+        _chunked_sentiment(ReviewBatch(reviews))
+    timings["chunked"] = (time.perf_counter() - start) / repeats
+
+    return {
+        "reviews": len(reviews),
+        "truncated_reviews_per_sec": len(reviews) / timings["truncated"],
+        "chunked_reviews_per_sec": len(reviews) / timings["chunked"],
+        "truncated_token_coverage": sum(truncated_lengths) / max(1, sum(full_lengths)),
+        "chunked_token_coverage": 1.0,
+        "device": "GPU" if device == 0 else "CPU"
+    }
+
 def analyze_sentiment(reviews):
     """
-    Analyzes sentiment of a list of reviews.
+    Analyzes sentiment of a list of reviews (or a ReviewBatch).
     Returns a dictionary with overall sentiment and detailed breakdown.
+    Per-review labels and scores are stored on the batch.
     """
-    if not reviews:
+    batch = ReviewBatch.coerce(reviews)
+    if not batch:
         return {
             "overall_score": 0.0,
             "sentiment_counts": {"POSITIVE": 0, "NEGATIVE": 0, "NEUTRAL": 0},
@@ -37,16 +183,14 @@ def analyze_sentiment(reviews):
     # Use Transformers if available and robust enough
     if transformers_available:
         try:
-             # Truncate to 512 tokens to avoid errors with some models
-            truncated_reviews = [review[:2000] for review in reviews] 
-            results = sentiment_pipeline(truncated_reviews)
+             results = _chunked_sentiment(batch)
         except Exception as e:
              print(f"Transformer inference failed, falling back to VADER: {e}")
              results = [] # Trigger fallback
 
     # Fallback to VADER if Transformers unavailable or failed
     if not results:
-        for review in reviews:
+        for review in batch.text:
             score = vader_analyzer.polarity_scores(review)
             if score['compound'] >= 0.05:
                 results.append({"label": "POSITIVE", "score": score['compound']})
@@ -58,34 +202,26 @@ def analyze_sentiment(reviews):
     end_time = time.time()
     inference_time = end_time - start_time
 
-    # Aggregation
-    sentiment_counts = {"POSITIVE": 0, "NEGATIVE": 0, "NEUTRAL": 0}
-    total_score = 0.0
-    
-    for res in results:
-        label = res['label'].upper() # Ensure uppercase
-        if label not in sentiment_counts:
-             # Map transformer output (e.g., 'LABEL_1') if necessary, though distilbert uses POSITIVE/NEGATIVE
-             if 'POSITIVE' in label or 'LABEL_1' in label: label = 'POSITIVE'
-             elif 'NEGATIVE' in label or 'LABEL_0' in label: label = 'NEGATIVE'
-             else: label = 'NEUTRAL'
-        
-        sentiment_counts[label] += 1
-        # Normalize score to 0-1 range for simple averaging, where POS=1, NEG=0
-        if label == 'POSITIVE':
-            total_score += res['score']
-        elif label == 'NEGATIVE':
-            total_score += (1 - res['score']) # Invert for specific logic if needed, but simple count is often better
-        else:
-            total_score += 0.5 
+    batch.set_scores("sentiment_label", np.array([_label_code(res['label']) for res in results], dtype=np.int8))
+    batch.set_scores("sentiment_score", np.array([res['score'] for res in results], dtype=np.float32))
+
+    return summarize_sentiment(batch, inference_time)
+
+def summarize_sentiment(batch, inference_time=0.0):
+    """
+    Aggregates the per-review sentiment arrays of a batch into the summary dict.
+    """
+    codes = batch.scores["sentiment_label"]
+    counts = np.bincount(codes, minlength=len(SENTIMENT_LABELS))
+    sentiment_counts = {"POSITIVE": int(counts[2]), "NEGATIVE": int(counts[0]), "NEUTRAL": int(counts[1])}
 
     # Normalize overall score components
-    positive_ratio = sentiment_counts['POSITIVE'] / len(reviews) if reviews else 0
+    positive_ratio = sentiment_counts['POSITIVE'] / len(batch) if len(batch) else 0
     
     return {
         "overall_score": positive_ratio * 10, # 0-10 scale
         "sentiment_counts": sentiment_counts,
-        "reviews_analyzed": len(reviews),
+        "reviews_analyzed": len(batch),
         "inference_time": inference_time,
         "device": "GPU" if device == 0 else "CPU"
     }
@@ -0,0 +1,218 @@
+import pickle
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from . import nlp, fake_review, pricing, vision, scoring
+from .reviews import ReviewBatch
+from .history import REVIEW_SCORE_COLUMNS
+
+# Dtypes of the per-review arrays written by nlp/fake_review (float32 otherwise)
+SCORE_DTYPES = {"sentiment_label": np.int8, "fake_flagged": bool}
+
+class StageCache:
+    """
+    Thread-safe LRU cache for analysis stage results, bounded by an
+    approximate memory budget. Meant to be shared across sessions.
+    """
+
+    def __init__(self, max_bytes=256 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key, value):
+        # Pickled size is a good enough estimate for dicts of arrays/scalars
+        size = len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self.current_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.current_bytes,
+                "hits": self.hits,
+                "misses": self.misses
+            }
+
+
+def content_hash(*parts):
+    """
+    Hashes stage inputs (str, bytes, numbers or None) into a cache key.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        if part is None:
+            data = b"\x00"
+        elif isinstance(part, bytes):
+            data = part
+        else:
+            data = repr(part).encode("utf-8")
+        h.update(len(data).to_bytes(8, "little"))
+        h.update(data)
+    return h.hexdigest()
+
+
+def _restore_scores(batch, scores):
+    for name, values in scores.items():
+        batch.set_scores(name, values.copy())
+
+
+def sentiment_stage(batch, cache=None):
+    """
+    The returned summary has "cached": True when it was served from the cache,
+    in which case its inference_time is from the run that computed it.
+    """
+    computed = []
+    def compute():
+        computed.append(True)
+        result = nlp.analyze_sentiment(batch)
+        return result, {k: v for k, v in batch.scores.items() if k.startswith("sentiment_")}
+
+    if cache is None:
+        return dict(compute()[0], cached=False)
+    result, scores = cache.get_or_compute(("sentiment", batch.content_hash), compute)
+    _restore_scores(batch, scores)
+    return dict(result, cached=not computed)
+
+
+def fake_review_stage(batch, cache=None):
+    def compute():
+        result = fake_review.detect_fake_reviews(batch)
+        return result, {k: v for k, v in batch.scores.items() if k.startswith("fake_")}
+
+    if cache is None:
+        return compute()[0]
+    result, scores = cache.get_or_compute(("fake_review", batch.content_hash), compute)
+    _restore_scores(batch, scores)
+    return result
+
+
+def pricing_stage(price, category, specs_text="", cache=None):
+    def compute():
+        return pricing.price_fairness(price, category, specs_text)
+
+    if cache is None:
+        return compute()
+    return cache.get_or_compute(("pricing", content_hash(float(price), category, specs_text)), compute)
+
+
+def vision_stage(image_bytes, cache=None):
+    def compute():
+        return vision.analyze_image(image_bytes)
+
+    if cache is None or not image_bytes:
+        return compute()
+    return cache.get_or_compute(("vision", content_hash(image_bytes)), compute)
+
+
+def incremental_review_stages(batch, store, product_id, cache=None):
+    """
+    Runs sentiment and fake-review analysis only on reviews that have no
+    stored results for this product, then aggregates over all reviews.
+    """
+    known = store.load_review_scores(product_id, batch.hashes)
+    signed = batch.hashes.view(np.int64)
+    is_new = np.array([int(h) not in known for h in signed], dtype=bool)
+
+    inference_time = 0.0
+    # No inference runs if every review already has stored results
+    cached = True
+    new_scores = {}
+    if is_new.any():
+        new_batch = ReviewBatch([t for t, new in zip(batch.text, is_new) if new])
+        new_sentiment = sentiment_stage(new_batch, cache)
+        inference_time = new_sentiment["inference_time"]
+        cached = new_sentiment["cached"]
+        fake_review_stage(new_batch, cache)
+        new_scores = new_batch.scores
+
+    # Merge stored and freshly computed per-review arrays in batch order
+    for column in REVIEW_SCORE_COLUMNS:
+        values = np.zeros(len(batch), dtype=SCORE_DTYPES.get(column, np.float32))
+        if column in new_scores:
+            values[is_new] = new_scores[column]
+        if (~is_new).any():
+            values[~is_new] = [known[int(h)][column] for h in signed[~is_new]]
+        batch.set_scores(column, values)
+
+    sentiment_res = dict(nlp.summarize_sentiment(batch, inference_time), cached=cached)
+    fake_res = fake_review.summarize_fake_reviews(batch)
+    return sentiment_res, fake_res, int(is_new.sum())
+
+
+def run_analysis(reviews, price, category, specs_text="", image_bytes=None, cache=None,
+                 store=None, product_id=None):
+    """
+    Runs every analysis stage, reusing cached stage results whose inputs
+    have not changed. The overall score is always recomputed (it is cheap).
+    With a HistoryStore and product ID, only reviews not seen in earlier
+    snapshots are analyzed and the result is saved as a new snapshot.
+    """
+    batch = ReviewBatch.coerce(reviews)
+    new_reviews = len(batch)
+    if store is not None and product_id:
+        sentiment_res, fake_res, new_reviews = incremental_review_stages(batch, store, product_id, cache)
+    else:
+        sentiment_res = sentiment_stage(batch, cache)
+        fake_res = fake_review_stage(batch, cache)
+    price_res = pricing_stage(price, category, specs_text, cache)
+    vision_res = vision_stage(image_bytes, cache)
+
+    overall_score = scoring.calculate_overall_score(
+        sentiment_res['overall_score'],
+        fake_res['fake_score'],
+        price_res['label'],
+        vision_res.get('quality_score', 0)
+    )
+
+    results = {
+        "batch": batch,
+        "sentiment": sentiment_res,
+        "fake": fake_res,
+        "price": price_res,
+        "vision": vision_res,
+        "overall_score": overall_score,
+        "new_reviews": new_reviews
+    }
+
+    if store is not None and product_id:
+        input_hash = analysis_input_hash(batch, price, category, specs_text, image_bytes)
+        store.save_analysis(product_id, batch, results, category, price, input_hash)
+    return results
+
+
+def analysis_input_hash(batch, price, category, specs_text="", image_bytes=None):
+    """
+    Hash of everything an analysis depends on, used to tell whether a
+    stored snapshot can be reused as-is.
+    """
+    return content_hash(batch.content_hash, float(price), category, specs_text, image_bytes)
@@ -0,0 +1,83 @@
+import hashlib
+from functools import cached_property
+import numpy as np
+from .utils import clean_text
+
+class ReviewBatch:
+    """
+    Columnar container for a set of reviews shared by every core module.
+    Derived features (normalized text, word counts, hashes, ...) are computed
+    lazily on first access and reused, so large review sets are only
+    processed once per analysis.
+    """
+
+    def __init__(self, reviews):
+        self.text = [r.strip() for r in reviews if r and r.strip()]
+        # Per-stage, per-review results (e.g. "sentiment_label", "fake_prob")
+        self.scores = {}
+        self._features = {}
+
+    @classmethod
+    def from_text(cls, reviews_text):
+        """
+        Builds a batch from newline-separated reviews (one per line).
+        """
+        return cls((reviews_text or "").split("\n"))
+
+    @classmethod
+    def coerce(cls, reviews):
+        """
+        Returns reviews as a ReviewBatch, wrapping plain lists if needed.
+        """
+        if isinstance(reviews, cls):
+            return reviews
+        return cls(reviews or [])
+
+    def __len__(self):
+        return len(self.text)
+
+    def __iter__(self):
+        return iter(self.text)
+
+    def __getitem__(self, i):
+        return self.text[i]
+
+    @cached_property
+    def normalized(self):
+        # Lowercased with whitespace collapsed
+        return [clean_text(r).lower() for r in self.text]
+
+    @cached_property
+    def word_counts(self):
+        return np.fromiter((len(r.split()) for r in self.normalized), dtype=np.int32, count=len(self))
+
+    @cached_property
+    def hashes(self):
+        # Stable 64-bit content hashes (used for dedup and caching)
+        return np.array(
+            [int.from_bytes(hashlib.blake2b(r.encode("utf-8"), digest_size=8).digest(), "little") for r in self.text],
+            dtype=np.uint64
+        )
+
+    @cached_property
+    def joined(self):
+        return " ".join(self.text)
+
+    @cached_property
+    def content_hash(self):
+        """
+        Hash of the whole batch, independent of how the input was formatted.
+        """
+        return hashlib.blake2b(self.hashes.tobytes(), digest_size=16).hexdigest()
+
+    def feature(self, name, compute):
+        """
+        Returns a module-specific derived feature, computing it once with
+        compute(batch) and caching it on the batch.
+        """
+        if name not in self._features:
+            self._features[name] = compute(self)
+        return self._features[name]
+
+    def set_scores(self, name, values):
+        self.scores[name] = np.asarray(values)
@@ -1,37 +1,157 @@
+import numpy as np
+
+# Points contributed by each signal; shared by the scalar and batch scorers
+DEFAULT_WEIGHTS = {
+    "sentiment": 0.5,       # per point of sentiment (0-10)
+    "fake_penalty": 2.0,    # points subtracted at 100% fake probability
+    "fair": 2.0,
+    "undervalued": 2.5,
+    "overpriced": 1.0,
+    "image": 1.0            # points at image quality 10/10
+}
+
 def calculate_overall_score(sentiment_score, fake_score, price_fairness_label, image_quality=0):
     """
     Calculates the final overall product score (0-10).
-    Weights:
+    Weights (see DEFAULT_WEIGHTS):
     - Sentiment: 50%
     - Fake Probability: -20% (Penalty)
     - Price Fairness: 20%
     - Image Quality: 10%
     """
-    
+    w = DEFAULT_WEIGHTS
+
     # 1. Sentiment Contribution (0-10 scale input) -> Max 5 points
-    score = sentiment_score * 0.5
+    score = sentiment_score * w["sentiment"]
     
     # 2. Fake Review Penalty
     # If 100% fake probability, subtract 2 points.
-    fake_penalty = (fake_score / 100.0) * 2.0
+    fake_penalty = (fake_score / 100.0) * w["fake_penalty"]
     score -= fake_penalty
     
     # 3. Price Fairness Bonus/Penalty
     if price_fairness_label == "Fair":
-        score += 2.0
+        score += w["fair"]
     elif price_fairness_label == "Undervalued":
-        score += 2.5 # Bonus for good deal
+        score += w["undervalued"] # Bonus for good deal
     else: # Overpriced
-        score += 1.0 # Smaller contribution
+        score += w["overpriced"] # Smaller contribution
         
     # 4. Image Quality (0-10 scale input) -> Max 1 point
-    score += (image_quality / 10.0) * 1.0
+    score += (image_quality / 10.0) * w["image"]
     
     # Clamp score to 0-10
     final_score = max(0.0, min(10.0, score))
     
     return round(final_score, 1)
 
+# Category codes for price_fairness labels used by the batch API.
+# Any other label is treated as "Overpriced", like the scalar function.
+PRICE_FAIRNESS_CODES = {"Fair": 0, "Undervalued": 1, "Overpriced": 2}
+
+def encode_price_labels(labels):
+    """
+    Converts price_fairness labels to PRICE_FAIRNESS_CODES (int8 array).
+    """
+    labels = np.asarray(labels, dtype=object)
+    codes = np.full(labels.shape, PRICE_FAIRNESS_CODES["Overpriced"], dtype=np.int8)
+    codes[labels == "Fair"] = PRICE_FAIRNESS_CODES["Fair"]
+    codes[labels == "Undervalued"] = PRICE_FAIRNESS_CODES["Undervalued"]
+    return codes
+
+def _round_1(values):
+    """
+    Vectorized equivalent of round(x, 1). np.round can differ from Python's
+    correctly rounded round() when x * 10 lands near .5, so those few values
+    are re-rounded in Python.
+    """
+    rounded = np.round(values, 1)
+    scaled = values * 10.0
+    near_half = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    for i in np.flatnonzero(near_half):
+        rounded[i] = round(float(values[i]), 1)
+    return rounded
+
+def calculate_overall_scores(sentiment_scores, fake_scores, price_fairness, image_quality=0, weights=None):
+    """
+    Vectorized calculate_overall_score for many products at once.
+    price_fairness may be labels ("Fair", ...) or PRICE_FAIRNESS_CODES;
+    codes outside PRICE_FAIRNESS_CODES raise ValueError.
+    With the default weights the results match the scalar function exactly,
+    including for NaN inputs.
+    """
+    w = dict(DEFAULT_WEIGHTS, **(weights or {}))
+    sentiment_scores = np.asarray(sentiment_scores, dtype=np.float64)
+    fake_scores = np.asarray(fake_scores, dtype=np.float64)
+    image_quality = np.broadcast_to(np.asarray(image_quality, dtype=np.float64), sentiment_scores.shape)
+
+    codes = np.asarray(price_fairness)
+    if not np.issubdtype(codes.dtype, np.integer):
+        codes = encode_price_labels(codes)
+    elif codes.size and (codes.min() < 0 or codes.max() >= len(PRICE_FAIRNESS_CODES)):
+        raise ValueError(f"price_fairness codes must be in {sorted(PRICE_FAIRNESS_CODES.values())}, "
+                         f"got values from {codes.min()} to {codes.max()}")
+    bonus = np.array([w["fair"], w["undervalued"], w["overpriced"]], dtype=np.float64)
+
+    # Same operation order as calculate_overall_score so floats match bit for bit
+    score = sentiment_scores * w["sentiment"]
+    score = score - (fake_scores / 100.0) * w["fake_penalty"]
+    score = score + bonus[codes]
+    score = score + (image_quality / 10.0) * w["image"]
+    # max(0.0, min(10.0, nan)) is 10.0 in the scalar function; np.clip would keep the NaN
+    score = np.where(np.isnan(score), 10.0, np.clip(score, 0.0, 10.0))
+
+    return _round_1(score)
+
+def score_dataframe(df, weights=None):
+    """
+    Scores a DataFrame with sentiment_score, fake_score, price_fairness_label
+    (or price_fairness_code) and optional image_quality columns.
+    """
+    if "price_fairness_code" in df:
+        price_fairness = df["price_fairness_code"].to_numpy()
+    else:
+        price_fairness = df["price_fairness_label"].to_numpy()
+    image_quality = df["image_quality"].to_numpy() if "image_quality" in df else 0
+    return calculate_overall_scores(
+        df["sentiment_score"].to_numpy(),
+        df["fake_score"].to_numpy(),
+        price_fairness,
+        image_quality,
+        weights
+    )
+
+def top_k(scores, k=10):
+    """
+    Returns indices of the k highest scores, best first, using a partial
+    sort. Ties are broken by index so results are deterministic.
+    """
+    scores = np.asarray(scores)
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.array([], dtype=np.int64)
+    idx = np.argpartition(-scores, k - 1)[:k]
+    # Pull in every entry tied with the k-th score so tie-breaking is by index
+    threshold = scores[idx].min()
+    idx = np.flatnonzero(scores >= threshold)
+    order = np.lexsort((idx, -scores[idx]))
+    return idx[order][:k]
+
+def category_leaderboard(scores, categories, k=10):
+    """
+    Returns {category: indices of its top-k scores, best first}.
+    """
+    scores = np.asarray(scores)
+    names, codes = np.unique(np.asarray(categories), return_inverse=True)
+    order = np.argsort(codes, kind="stable")
+    bounds = np.concatenate(([0], np.cumsum(np.bincount(codes, minlength=len(names)))))
+
+    leaderboard = {}
+    for i, name in enumerate(names):
+        members = order[bounds[i]:bounds[i + 1]]
+        leaderboard[name.item() if hasattr(name, "item") else name] = members[top_k(scores[members], k)]
+    return leaderboard
+
 def get_durability_risk(sentiment_data):
     """
     Estimates durability risk based on negative sentiment keywords.
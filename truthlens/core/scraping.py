@@ -1,8 +1,8 @@
-import requests
 from bs4 import BeautifulSoup
 import random
 import time
 from .utils import clean_text, format_price
+from .http_replay import fetch
 
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
@@ -26,7 +26,7 @@ def scrape_amazon(url):
     Returns a dictionary with title, price, ratings, and reviews.
     """
     try:
-        response = requests.get(url, headers=get_headers(), timeout=10)
+        response = fetch(url, headers=get_headers(), timeout=10)
         
         # If successfully bypassed
         if response.status_code == 200:
@@ -154,7 +154,7 @@ def scrape_flipkart(url):
     # We are adding a simple fallback mechanism here to fetch basic data or return simulated data if blocked.
     try:
         # First attempt with requests
-        response = requests.get(url, headers=get_headers(), timeout=10)
+        response = fetch(url, headers=get_headers(), timeout=10)
         
         # If successfully bypassed
         if response.status_code == 200:
@@ -219,13 +219,19 @@ def scrape_flipkart(url):
             "source": "Flipkart (Fallback)"
         }
 
-def scrape_product(url):
+def scrape_product(url, store=None):
     """
     Main scraping function that dispatches to specific scrapers based on URL.
+    If a HistoryStore is given, the scraped fields and reviews are saved to it.
     """
     if "amazon" in url.lower():
-        return scrape_amazon(url)
+        data = scrape_amazon(url)
     elif "flipkart" in url.lower():
-        return scrape_flipkart(url)
+        data = scrape_flipkart(url)
     else:
         return {"error": "Unsupported URL or scraping failed."}
+
+    # Simulated fallback data (blocked/failed scrape) is never stored
+    if store is not None and "Fallback" not in data.get("source", ""):
+        data["product_id"] = store.save_scrape(url, data)
+    return data
@@ -1,12 +1,15 @@
 import re
 
+WHITESPACE_RE = re.compile(r'\s+')
+NON_PRICE_RE = re.compile(r'[^\d.]')
+
 def clean_text(text):
     """
     Cleans text by removing extra whitespace and special characters.
     """
     if not text:
         return ""
-    text = re.sub(r'\s+', ' ', text).strip()
+    text = WHITESPACE_RE.sub(' ', text).strip()
     return text
 
 def format_price(price_str):
@@ -17,7 +20,7 @@ def format_price(price_str):
     if not price_str:
         return 0.0
     # Remove currency symbols and commas
-    price_clean = re.sub(r'[^\d.]', '', price_str)
+    price_clean = NON_PRICE_RE.sub('', price_str)
     try:
         return float(price_clean)
     except ValueError:
@@ -0,0 +1,79 @@
+import time
+from collections import Counter
+
+import pytest
+
+from core import http_replay
+from core.crawler import Crawler, build_stand_in_site
+from core.history import HistoryStore
+
+
+@pytest.fixture
+def flaky_site(tmp_path):
+    """
+    Stand-in catalog served with injected 429s and bot-wall pages.
+    """
+    recordings = str(tmp_path / "site")
+    seed = build_stand_in_site(recordings, n_products=25, per_page=5)
+    server = http_replay.ReplayServer(port=0, recordings_dir=recordings, latency=0.05, rate_limit_rate=0.2,
+                                      bot_wall_rate=0.2, seed=1).start()
+    saved = (http_replay.HTTP_MODE, http_replay.RECORDINGS_DIR, http_replay.REPLAY_URL)
+    http_replay.set_mode("replay", recordings_dir=recordings, replay_url=server.url)
+    yield seed, server
+    http_replay.HTTP_MODE, http_replay.RECORDINGS_DIR, http_replay.REPLAY_URL = saved
+    server.stop()
+
+
+def make_crawler(tmp_path, analyzed, max_workers=4):
+    crawler = Crawler(state_path=str(tmp_path / "crawl_state.json"),
+                      store=HistoryStore(str(tmp_path / "history.sqlite")),
+                      max_workers=max_workers, delay=0, max_retries=20, retry_backoff=0)
+    def analyze(url, data):
+        # Stands in for the ML stages; slow enough that scrapes finish together
+        time.sleep(0.1)
+        analyzed.update([url])
+        return {"overall_score": 5.0}
+
+    crawler._analyze = analyze
+    return crawler
+
+
+def test_crawl_analyzes_every_product_once_across_resume(tmp_path, flaky_site):
+    seed, server = flaky_site
+    analyzed = Counter()
+
+    first = make_crawler(tmp_path, analyzed)
+    stats = first.run([seed], max_products=10)
+    assert sum(analyzed.values()) == 10
+    assert first.frontier
+
+    # A new crawler resumes from the saved frontier and Bloom filter
+    second = make_crawler(tmp_path, analyzed)
+    second.run([], max_products=100)
+
+    assert len(analyzed) == 25
+    assert set(analyzed.values()) == {1}
+    assert not second.frontier
+    assert second.stats["gave_up"] == 0
+    assert stats["retried"] > 0
+    assert server.stats.get("429", 0) > 0 and server.stats.get("bot_wall", 0) > 0
+
+
+def test_scrapes_finishing_after_the_limit_are_kept(tmp_path, flaky_site):
+    _, server = flaky_site
+    server.rate_limit_rate = server.bot_wall_rate = 0.0
+    # One listing page with all 25 products, so 16 scrapes are in flight at once
+    seed = build_stand_in_site(server.recordings_dir, n_products=25, per_page=25, base_url="https://www.amazon.com")
+    analyzed = Counter()
+
+    crawler = make_crawler(tmp_path, analyzed, max_workers=8)
+    # Scrapes finish instantly, so more complete while one is analyzed than the limit allows
+    crawler._scrape = lambda url: {"title": url, "price": 1.0, "reviews": ["ok"], "source": "Amazon"}
+    crawler.run([seed], max_products=3)
+    assert sum(analyzed.values()) == 3
+
+    resumed = make_crawler(tmp_path, analyzed)
+    resumed._scrape = crawler._scrape
+    resumed.run([], max_products=100)
+    assert len(analyzed) == 25
+    assert set(analyzed.values()) == {1}
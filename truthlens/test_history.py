@@ -0,0 +1,32 @@
+import pytest
+
+from core.history import HistoryStore, canonical_product_id
+
+
+@pytest.mark.parametrize("url, product_id", [
+    ("https://www.amazon.in/Some-Phone/dp/B08N5WRWNW/ref=sr_1_1", "amazon.in:B08N5WRWNW"),
+    ("https://amazon.in/gp/product/b08n5wrwnw?th=1", "amazon.in:B08N5WRWNW"),
+    ("https://www.amazon.com/dp/B08N5WRWNW", "amazon.com:B08N5WRWNW"),
+    ("https://www.amazon.co.uk/dp/B08N5WRWNW", "amazon.co.uk:B08N5WRWNW"),
+    ("https://www.flipkart.com/phone/p/itmABC123?pid=MOBXYZ", "flipkart:itmabc123"),
+    ("https://www.flipkart.com/phone/p/itmabc123", "flipkart:itmabc123"),
+    ("https://dl.flipkart.com/dl/product?pid=mobxyz", "flipkart:MOBXYZ"),
+    ("https://example.com/dp/B08N5WRWNW", None),
+])
+def test_canonical_product_id(url, product_id):
+    assert canonical_product_id(url) == product_id
+
+
+def test_flipkart_pid_resolves_to_item_id_once_seen():
+    store = HistoryStore(":memory:")
+    pid_only = "https://dl.flipkart.com/dl/product?pid=MOBXYZ"
+    assert store.resolve_product_id(pid_only) == "flipkart:MOBXYZ"
+    store.save_scrape("https://www.flipkart.com/phone/p/itmabc123?pid=MOBXYZ",
+                      {"title": "Phone", "price": 100, "reviews": ["Good"]})
+    assert store.resolve_product_id(pid_only) == "flipkart:itmabc123"
+
+
+def test_missing_rating_is_stored_as_null():
+    store = HistoryStore(":memory:")
+    product_id = store.save_scrape("https://www.amazon.in/dp/B08N5WRWNW", {"title": "Phone", "price": 100, "reviews": []})
+    assert store.load_product(product_id)["rating"] is None
@@ -0,0 +1,57 @@
+import pytest
+
+from core import http_replay
+from core.crawler import build_stand_in_site
+from core.http_replay import ReplayServer, load_expected, run_load_test, save_expected, _percentile
+
+
+def product_url(i):
+    return f"https://www.amazon.in/Test-Product-{i}/dp/B0TEST{i:04d}/ref=sr_1_{i}"
+
+
+@pytest.fixture
+def replay(tmp_path):
+    recordings = str(tmp_path / "recordings")
+    build_stand_in_site(recordings, n_products=5, per_page=5)
+    server = ReplayServer(port=0, recordings_dir=recordings).start()
+    saved = (http_replay.HTTP_MODE, http_replay.RECORDINGS_DIR, http_replay.REPLAY_URL)
+    http_replay.set_mode("replay", recordings_dir=recordings, replay_url=server.url)
+    yield recordings, server
+    http_replay.HTTP_MODE, http_replay.RECORDINGS_DIR, http_replay.REPLAY_URL = saved
+    server.stop()
+
+
+def test_bench_reports_parsing_mismatches(replay):
+    recordings, server = replay
+    urls = [product_url(i) for i in range(5)]
+    for i, url in enumerate(urls):
+        save_expected(url, {"title": f"Test Product {i}", "price": float(100 + i * 10),
+                            "reviews": ["a", "b"]}, recordings)
+    # A baseline the current parser no longer matches
+    save_expected(urls[3], {"title": "Renamed", "price": 130.0, "reviews": ["a", "b"]}, recordings)
+
+    expected = load_expected(urls, recordings)
+    assert len(expected) == 5
+    report = run_load_test(urls, concurrency=4, expected=expected)
+    assert report["parsed"] == 5
+    assert [m["url"] for m in report["mismatches"]] == [urls[3]]
+    assert report["mismatches"][0]["got"]["title"] == "Test Product 3"
+
+
+def test_injected_failures_are_fallbacks_not_mismatches(replay):
+    recordings, server = replay
+    urls = [product_url(i) for i in range(5)]
+    for i, url in enumerate(urls):
+        save_expected(url, {"title": f"Test Product {i}", "price": float(100 + i * 10),
+                            "reviews": ["a", "b"]}, recordings)
+    server.bot_wall_rate = 1.0
+    report = run_load_test(urls, expected=load_expected(urls, recordings))
+    assert report["fallbacks"] == 5
+    assert report["mismatches"] == []
+
+
+def test_percentile_uses_nearest_rank():
+    values = [float(i) for i in range(1, 11)]
+    assert _percentile(values, 0.95) == 10.0
+    assert _percentile(values, 0.50) == 5.0
+    assert _percentile([], 0.95) == 0.0
@@ -0,0 +1,112 @@
+import numpy as np
+import pytest
+
+from core.index import ProductIndex
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_save_load_round_trip(tmp_path, mmap):
+    path = str(tmp_path / "index")
+    index = ProductIndex(path, mmap=mmap)
+    index.add("Phone A 128GB", "Electronics", 100.0, 7.5)
+    index.add("Phone B 256GB", "Electronics", 150.0, 8.0)
+    index.save()
+
+    # Append after a save, and update a saved row in place
+    index.add("Kettle", "Home", 30.0, 6.0)
+    index.add("Phone A 128GB", "Electronics", 90.0, 9.0)
+    index.save()
+
+    loaded = ProductIndex(path, mmap=mmap)
+    assert loaded.size == 3
+    assert loaded.titles == ["Phone A 128GB", "Phone B 256GB", "Kettle"]
+    assert loaded.categories == ["Electronics", "Home"]
+    np.testing.assert_array_equal(loaded.prices[:3], [90.0, 150.0, 30.0])
+    np.testing.assert_array_equal(loaded.scores[:3], [9.0, 8.0, 6.0])
+    np.testing.assert_array_equal(loaded._vectors(range(3)), index._vectors(range(3)))
+
+    results = loaded.query("Phone B 256GB", min_score=5.0, price_range=(50, 200))
+    assert [r["title"] for r in results] == ["Phone A 128GB"]
+    assert results[0]["price"] == 90.0
+
+
+def test_unsaved_rows_are_ignored_after_crash(tmp_path):
+    path = str(tmp_path / "index")
+    index = ProductIndex(path)
+    index.add("A", "Electronics", 1.0, 5.0)
+    index.save()
+    # Bytes past meta.json's size (e.g. a save that died) are ignored and overwritten
+    with open(tmp_path / "index" / "prices.f32", "ab") as f:
+        f.write(np.float32(123.0).tobytes())
+
+    reopened = ProductIndex(path)
+    assert reopened.size == 1
+    reopened.add("B", "Electronics", 2.0, 6.0)
+    reopened.save()
+    assert ProductIndex(path).prices[:2].tolist() == [1.0, 2.0]
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_two_writers_do_not_lose_rows(tmp_path, mmap):
+    path = str(tmp_path / "index")
+    app = ProductIndex(path, mmap=mmap)
+    app.add("A", "Electronics", 10.0, 5.0)
+    app.save()
+
+    crawler = ProductIndex(path, mmap=mmap)
+    for i in range(5):
+        crawler.add(f"Crawled {i}", "Books", 20.0 + i, 6.0)
+    crawler.add("A", "Electronics", 11.0, 5.5)
+    crawler.save()
+
+    app.add("B", "Electronics", 12.0, 7.0)
+    app.save()
+
+    loaded = ProductIndex(path, mmap=mmap)
+    assert loaded.titles == ["A"] + [f"Crawled {i}" for i in range(5)] + ["B"]
+    assert loaded.categories == ["Electronics", "Books"]
+    assert loaded.category_codes[6] == 0
+    assert loaded.prices[0] == 11.0
+    np.testing.assert_array_equal(loaded._vectors([6]), app._vectors([6]))
+
+
+def test_query_picks_up_rows_saved_by_another_process(tmp_path):
+    path = str(tmp_path / "index")
+    app = ProductIndex(path)
+    app.add("Laptop 16GB", "Electronics", 500.0, 6.0)
+    app.save()
+    assert app.query("Laptop 16GB") == []
+
+    crawler = ProductIndex(path)
+    crawler.add("Laptop 32GB", "Electronics", 600.0, 8.0)
+    crawler.save()
+
+    app.add("Unsaved laptop", "Electronics", 400.0, 7.0)
+    results = app.query("Laptop 16GB", min_score=6.0)
+    assert {r["title"] for r in results} == {"Laptop 32GB", "Unsaved laptop"}
+    app.save()
+    assert ProductIndex(path).size == 3
+
+
+def test_partitions_match_exact_search(tmp_path):
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(200)]
+    path = str(tmp_path / "index")
+    index = ProductIndex(path)
+    for i in range(2000):
+        index.add(" ".join(rng.choice(words, 4)) + f" item{i}", "Electronics", float(i), float(i % 10))
+    index.save()
+    exact = [index.query(index.titles[i], k=5) for i in range(0, 2000, 97)]
+
+    index.build_partitions(n_lists=16)
+    index.save()
+    # Rows added after the partition was built are still found
+    index.add("w1 w2 w3 w4 late", "Electronics", 1.0, 9.0)
+
+    reloaded = ProductIndex(path)
+    assert reloaded._list_rows is not None
+    assert sorted(reloaded._list_rows.tolist()) == list(range(2000))
+    for i, expected in zip(range(0, 2000, 97), exact):
+        # Probing every list is exhaustive, so results match the full scan
+        assert reloaded.query(index.titles[i], k=5, n_probe=16) == expected
+    assert index.query("w1 w2 w3 w4 late", k=1, exclude_title=False)[0]["title"] == "w1 w2 w3 w4 late"
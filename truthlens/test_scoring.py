@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+import pytest
+from hypothesis import given, settings, strategies as st
+
+from core.scoring import calculate_overall_score, calculate_overall_scores, score_dataframe
+
+# Unknown labels score like "Overpriced" in both implementations
+labels = st.sampled_from(["Fair", "Undervalued", "Overpriced", "Unknown"])
+nan = st.just(float("nan"))
+rows = st.tuples(
+    st.one_of(st.floats(0, 10), nan),
+    st.one_of(st.floats(0, 100), nan),
+    labels,
+    st.one_of(st.integers(0, 10), st.floats(0, 10), nan)
+)
+
+
+@settings(max_examples=500, deadline=None)
+@given(st.lists(rows, min_size=1, max_size=50))
+def test_batch_matches_scalar(products):
+    sentiment, fake, price, image = map(list, zip(*products))
+    expected = np.array([calculate_overall_score(*p) for p in products])
+
+    assert np.array_equal(calculate_overall_scores(sentiment, fake, price, image), expected)
+    df = pd.DataFrame({
+        "sentiment_score": sentiment,
+        "fake_score": fake,
+        "price_fairness_label": price,
+        "image_quality": image
+    })
+    assert np.array_equal(score_dataframe(df), expected)
+
+
+@settings(max_examples=200, deadline=None)
+@given(st.lists(st.tuples(
+    st.integers(0, 1000).map(lambda x: x / 100),
+    st.integers(0, 10000).map(lambda x: x / 100),
+    labels,
+    st.integers(0, 10)
+), min_size=1, max_size=50))
+def test_batch_matches_scalar_on_rounding_boundaries(products):
+    # Two-decimal inputs often land exactly on x.x5, where rounding differs most easily
+    sentiment, fake, price, image = map(list, zip(*products))
+    expected = np.array([calculate_overall_score(*p) for p in products])
+    assert np.array_equal(calculate_overall_scores(sentiment, fake, price, image), expected)
+
+
+@pytest.mark.parametrize("codes", [[0, -1], [0, 3]])
+def test_out_of_range_codes_are_rejected(codes):
+    with pytest.raises(ValueError):
+        calculate_overall_scores([5.0, 5.0], [0.0, 0.0], np.array(codes))